@@ -1,8 +1,37 @@
-"""Experiments to evaluate spectral similarities."""
+"""Experiments to evaluate spectral similarities.
 
-import silence_tensorflow.auto  # pylint: disable=unused-import
-from experiments.experiment import experiment
+The experiment is imported lazily, so that the submodules that do not score
+spectra, such as the report of the stored results, can be imported without
+loading the scoring libraries.
+"""
+
+import sys
+from types import ModuleType
 
 __all__ = [
     "experiment",
 ]
+
+
+class _ExperimentsModule(ModuleType):
+    """Package binding the experiment over the submodule of the same name."""
+
+    def __setattr__(self, name: str, value):
+        # Importing the experiments.experiment submodule binds it on the
+        # package, which would otherwise shadow the experiment it defines.
+        if name == "experiment" and isinstance(value, ModuleType):
+            value = value.experiment
+        super().__setattr__(name, value)
+
+
+def __getattr__(name: str):
+    """Return the experiment, importing it on first access."""
+    if name == "experiment":
+        # pylint: disable=import-outside-toplevel,unused-import
+        import experiments.experiment
+
+        return globals()["experiment"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+sys.modules[__name__].__class__ = _ExperimentsModule
@@ -0,0 +1,104 @@
+"""Submodule providing the convergence criterion of the adaptive iterations."""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import t
+from dict_hash import Hashable, sha256
+from experiments.exceptions import InvalidConvergenceCriterion
+
+# Columns identifying the correlations estimated within a cell of the experiment,
+# that is within the results of a similarity measure on a dataset.
+CORRELATION_KEYS: list[str] = [
+    "fingerprint",
+    "spectral_similarity",
+    "correlation_method",
+]
+
+
+def count_iterations(results: pd.DataFrame) -> int:
+    """Return the number of iterations within the results of a cell."""
+    if results.empty:
+        return 0
+    return int(results.groupby(CORRELATION_KEYS).size().max())
+
+
+class ConvergenceCriterion(Hashable):
+    """Criterion stopping the iterations once the correlation estimates converge.
+
+    The iterations of a cell converge when the confidence interval of the mean
+    of each of its correlations is narrower than the target width. Correlations
+    with fewer than two defined values, such as those of constant similarities,
+    are ignored.
+    """
+
+    def __init__(
+        self,
+        target_width: float,
+        min_iterations: int = 3,
+        confidence_level: float = 0.95,
+    ):
+        """Initialize the convergence criterion.
+
+        Parameters
+        ----------
+        target_width : float
+            The width below which the confidence intervals are considered converged.
+        min_iterations : int
+            The number of iterations executed before checking for convergence.
+        confidence_level : float
+            The confidence level of the confidence intervals.
+        """
+        if target_width <= 0:
+            raise InvalidConvergenceCriterion(
+                f"the target width must be positive, got {target_width}"
+            )
+        if min_iterations < 2:
+            raise InvalidConvergenceCriterion(
+                f"at least two iterations are needed, got {min_iterations}"
+            )
+        if not 0 < confidence_level < 1:
+            raise InvalidConvergenceCriterion(
+                f"the confidence level must be in (0, 1), got {confidence_level}"
+            )
+        self._target_width: float = target_width
+        self._min_iterations: int = min_iterations
+        self._confidence_level: float = confidence_level
+
+    @property
+    def min_iterations(self) -> int:
+        """Return the number of iterations executed before checking for convergence."""
+        return self._min_iterations
+
+    def width(self, results: pd.DataFrame) -> float:
+        """Return the widest confidence interval of the correlations of a cell."""
+        widths: list[float] = []
+        for _, correlations in results.groupby(CORRELATION_KEYS)["correlation"]:
+            correlations = correlations.dropna()
+            if len(correlations) < 2:
+                continue
+            widths.append(
+                2
+                * t.ppf((1 + self._confidence_level) / 2, len(correlations) - 1)
+                * correlations.std(ddof=1)
+                / np.sqrt(len(correlations))
+            )
+        return max(widths, default=0.0)
+
+    def converged(self, results: pd.DataFrame) -> bool:
+        """Return whether the iterations of a cell have converged."""
+        return (
+            count_iterations(results) >= self._min_iterations
+            and self.width(results) < self._target_width
+        )
+
+    def to_dict(self) -> dict:
+        """Return the convergence criterion as a dictionary."""
+        return {
+            "target_width": self._target_width,
+            "min_iterations": self._min_iterations,
+            "confidence_level": self._confidence_level,
+        }
+
+    def consistent_hash(self, use_approximation: bool = False) -> str:
+        """Return a consistent hash of the convergence criterion."""
+        return sha256(self.to_dict(), use_approximation=use_approximation)
@@ -0,0 +1,434 @@
+"""Submodule providing the correlation stage between similarity matrices."""
+
+from typing import Hashable, Iterable, Optional
+from collections import OrderedDict
+from threading import Lock
+from numba import njit
+import numpy as np
+from scipy.stats import beta, kendalltau, norm, t
+
+
+def sample_pairs(
+    number_of_pairs: int, sample_size: int, random_state: int
+) -> Optional[np.ndarray]:
+    """Return the sorted flat indices of the pairs used by the rank correlations.
+
+    Parameters
+    ----------
+    number_of_pairs : int
+        Total number of pairs in the similarity matrices.
+    sample_size : int
+        Number of pairs that fit in the memory budget.
+    random_state : int
+        The random state used to sample the pairs.
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        None when all the pairs are used, the sorted indices otherwise.
+    """
+    if sample_size >= number_of_pairs:
+        return None
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(number_of_pairs, size=sample_size, replace=False))
+
+
+def bootstrap_pairs(
+    pool_quantity: int,
+    quantity: int,
+    rows: Iterable[int],
+    random_state: tuple[int, int],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the pairs of the pool drawn with replacement for the rows of a tile.
+
+    Each row of a bootstrapped step holds a row of pairs of the pool, drawn
+    independently and with replacement from all of the pairs of the pool, so
+    that the self-pairs are no more likely than in the pool. The pairs of each
+    row are drawn from their own random state, so they do not depend on the
+    size of the tiles.
+
+    Parameters
+    ----------
+    pool_quantity : int
+        Number of spectra in the pool.
+    quantity : int
+        Number of pairs in each row of the step.
+    rows : Iterable[int]
+        The rows of the step in the tile.
+    random_state : tuple[int, int]
+        The random state of the pool and the iteration of the step.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The indices in the pool of the rows and of the columns of each pair,
+        of shape (number of rows, quantity).
+    """
+    pairs: np.ndarray = np.stack(
+        [
+            np.random.default_rng((*random_state, row)).integers(
+                pool_quantity, size=(2, quantity)
+            )
+            for row in rows
+        ],
+        axis=1,
+    )
+    return pairs[0], pairs[1]
+
+
+def pearson_p_value(correlation: float, number_of_pairs: int) -> float:
+    """Return the two-sided p-value of a Pearson correlation, as in scipy's pearsonr."""
+    if number_of_pairs <= 2 or np.isnan(correlation):
+        return 1.0 if number_of_pairs <= 2 else np.nan
+    shape: float = number_of_pairs / 2 - 1
+    return float(2 * beta.sf(abs(correlation), shape, shape, loc=-1, scale=2))
+
+
+@njit(nogil=True)
+def _count_discordant_pairs(ranks: np.ndarray) -> int:
+    """Return the number of pairs i < j with ranks[i] > ranks[j], by merge sort."""
+    size: int = ranks.shape[0]
+    values = ranks.copy()
+    buffer = np.empty_like(values)
+    discordant: int = 0
+    width: int = 1
+    while width < size:
+        for start in range(0, size, 2 * width):
+            middle: int = min(start + width, size)
+            stop: int = min(start + 2 * width, size)
+            left, right, position = start, middle, start
+            while left < middle and right < stop:
+                if values[right] < values[left]:
+                    buffer[position] = values[right]
+                    discordant += middle - left
+                    right += 1
+                else:
+                    buffer[position] = values[left]
+                    left += 1
+                position += 1
+            while left < middle:
+                buffer[position] = values[left]
+                left += 1
+                position += 1
+            while right < stop:
+                buffer[position] = values[right]
+                right += 1
+                position += 1
+        values, buffer = buffer, values
+        width *= 2
+    return discordant
+
+
+class PearsonAccumulator:
+    """Accumulator of the Pearson correlation between two similarity matrices.
+
+    The correlation is accumulated exactly tile by tile, so that
+    neither matrix needs to be resident in memory as a whole.
+    """
+
+    def __init__(self):
+        """Initialize the Pearson accumulator."""
+        self._number_of_pairs: int = 0
+        self._fingerprint_mean: float = 0.0
+        self._spectral_mean: float = 0.0
+        self._fingerprint_squares: float = 0.0
+        self._spectral_squares: float = 0.0
+        self._cross_products: float = 0.0
+
+    def update(self, fingerprint_tile: np.ndarray, spectral_tile: np.ndarray) -> None:
+        """Accumulate the next tiles of the similarities."""
+        # We merge the centred moments of the tile with the ones accumulated
+        # so far, following Chan et al., so that the Pearson correlation is
+        # numerically stable regardless of the number of tiles.
+        fingerprint_values = fingerprint_tile.astype(np.float64).ravel()
+        spectral_values = spectral_tile.astype(np.float64).ravel()
+        tile_pairs: int = fingerprint_values.size
+        tile_fingerprint_mean: float = fingerprint_values.mean()
+        tile_spectral_mean: float = spectral_values.mean()
+        fingerprint_values -= tile_fingerprint_mean
+        spectral_values -= tile_spectral_mean
+
+        total_pairs: int = self._number_of_pairs + tile_pairs
+        fingerprint_delta: float = tile_fingerprint_mean - self._fingerprint_mean
+        spectral_delta: float = tile_spectral_mean - self._spectral_mean
+        weight: float = self._number_of_pairs * tile_pairs / total_pairs
+
+        self._fingerprint_squares += (
+            np.dot(fingerprint_values, fingerprint_values)
+            + fingerprint_delta**2 * weight
+        )
+        self._spectral_squares += (
+            np.dot(spectral_values, spectral_values) + spectral_delta**2 * weight
+        )
+        self._cross_products += (
+            np.dot(fingerprint_values, spectral_values)
+            + fingerprint_delta * spectral_delta * weight
+        )
+        self._fingerprint_mean += fingerprint_delta * tile_pairs / total_pairs
+        self._spectral_mean += spectral_delta * tile_pairs / total_pairs
+        self._number_of_pairs = total_pairs
+
+    def correlation(self) -> tuple[float, float]:
+        """Return the Pearson correlation and its p-value."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pearson: float = float(
+                np.clip(
+                    self._cross_products
+                    / np.sqrt(self._fingerprint_squares * self._spectral_squares),
+                    -1.0,
+                    1.0,
+                )
+            )
+        return pearson, pearson_p_value(pearson, self._number_of_pairs)
+
+
+class RankedSimilarities:
+    """Ranks and tie structure of the similarities of the pairs used by the rank correlations.
+
+    The similarities are sorted once, and both Spearman and Kendall are then
+    evaluated from the ranks against any number of other similarities.
+    """
+
+    def __init__(self, similarities: np.ndarray):
+        """Initialize the ranked similarities.
+
+        Parameters
+        ----------
+        similarities : np.ndarray
+            The similarities of the pairs used by the rank correlations.
+        """
+        self._number_of_pairs: int = similarities.size
+
+        # The dense ranks identify the groups of tied similarities, from which
+        # we derive the average ranks used by Spearman, as in scipy's rankdata.
+        _, dense_ranks = np.unique(similarities.ravel(), return_inverse=True)
+        self._dense_ranks: np.ndarray = dense_ranks.astype(np.intp, copy=False)
+        counts: np.ndarray = np.bincount(self._dense_ranks).astype(np.int64)
+        average_ranks: np.ndarray = (np.cumsum(counts) - (counts - 1) / 2)[
+            self._dense_ranks
+        ]
+        average_ranks -= average_ranks.mean()
+        ranks_norm: float = np.sqrt(np.dot(average_ranks, average_ranks))
+        self._standardized_ranks: Optional[np.ndarray] = (
+            average_ranks / ranks_norm if ranks_norm > 0 else None
+        )
+
+        # Tie statistics used by Kendall's tau-b and its asymptotic variance.
+        ties: np.ndarray = counts[counts > 1]
+        self._ties: int = int((ties * (ties - 1) // 2).sum())
+        self._ties_cubic: int = int((ties * (ties - 1.0) * (ties - 2)).sum())
+        self._ties_variance: int = int((ties * (ties - 1.0) * (2 * ties + 5)).sum())
+
+    @property
+    def number_of_pairs(self) -> int:
+        """Return the number of ranked pairs."""
+        return self._number_of_pairs
+
+    def spearman(self, other: "RankedSimilarities") -> tuple[float, float]:
+        """Return the Spearman correlation with the other similarities and its p-value."""
+        if self._standardized_ranks is None or other._standardized_ranks is None:
+            return np.nan, np.nan
+        correlation: float = float(
+            np.clip(
+                np.dot(self._standardized_ranks, other._standardized_ranks), -1.0, 1.0
+            )
+        )
+        degrees_of_freedom: int = self._number_of_pairs - 2
+        with np.errstate(divide="ignore"):
+            statistic: float = correlation * np.sqrt(
+                max(
+                    degrees_of_freedom / ((correlation + 1.0) * (1.0 - correlation)),
+                    0.0,
+                )
+            )
+        return correlation, float(2 * t.sf(abs(statistic), degrees_of_freedom))
+
+    def kendall(self, other: "RankedSimilarities") -> tuple[float, float]:
+        """Return Kendall's tau-b with the other similarities and its p-value."""
+        size: int = self._number_of_pairs
+        total: int = size * (size - 1) // 2
+        if self._ties == total or other._ties == total:
+            return np.nan, np.nan
+
+        order: np.ndarray = np.lexsort((other._dense_ranks, self._dense_ranks))
+        ranks: np.ndarray = self._dense_ranks[order]
+        other_ranks: np.ndarray = other._dense_ranks[order]
+        discordant: int = int(_count_discordant_pairs(other_ranks))
+
+        boundaries: np.ndarray = np.r_[
+            True,
+            (ranks[1:] != ranks[:-1]) | (other_ranks[1:] != other_ranks[:-1]),
+            True,
+        ]
+        del ranks, other_ranks
+        joint_counts: np.ndarray = np.diff(np.nonzero(boundaries)[0]).astype(np.int64)
+        joint_ties: int = int((joint_counts * (joint_counts - 1) // 2).sum())
+
+        concordant_minus_discordant: int = (
+            total - self._ties - other._ties + joint_ties - 2 * discordant
+        )
+        correlation: float = float(
+            np.clip(
+                concordant_minus_discordant
+                / np.sqrt(total - self._ties)
+                / np.sqrt(total - other._ties),
+                -1.0,
+                1.0,
+            )
+        )
+
+        if (
+            self._ties == 0
+            and other._ties == 0
+            and (size <= 33 or min(discordant, total - discordant) <= 1)
+        ):
+            # The exact p-value is only used by scipy for small samples
+            # without ties, where recomputing it from the ranks is cheap.
+            return correlation, float(
+                kendalltau(self._dense_ranks, other._dense_ranks).pvalue
+            )
+
+        pairs_permutations: float = size * (size - 1.0)
+        variance: float = (
+            (
+                pairs_permutations * (2 * size + 5)
+                - self._ties_variance
+                - other._ties_variance
+            )
+            / 18
+            + (2 * self._ties * other._ties) / pairs_permutations
+            + self._ties_cubic
+            * other._ties_cubic
+            / (9 * pairs_permutations * (size - 2))
+        )
+        statistic: float = concordant_minus_discordant / np.sqrt(variance)
+        return correlation, float(2 * norm.sf(abs(statistic)))
+
+
+class PairsGatherer:
+    """Gatherer of the similarities of the pairs used by the rank correlations."""
+
+    def __init__(self, shape: tuple[int, int], pairs: Optional[np.ndarray]):
+        """Initialize the pairs gatherer.
+
+        Parameters
+        ----------
+        shape : tuple[int, int]
+            The shape of the similarity matrix.
+        pairs : Optional[np.ndarray]
+            The sorted flat indices of the pairs used by the rank correlations,
+            or None to use all of the pairs.
+        """
+        self._number_of_columns: int = shape[1]
+        self._pairs: Optional[np.ndarray] = pairs
+        self._similarities: np.ndarray = np.empty(
+            shape[0] * shape[1] if pairs is None else pairs.size, dtype=np.float32
+        )
+        self._start: int = 0
+
+    def update(self, tile: np.ndarray) -> None:
+        """Gather the pairs of the next tile of consecutive rows of the similarities."""
+        start: int = self._start * self._number_of_columns
+        stop: int = start + tile.shape[0] * self._number_of_columns
+        if self._pairs is None:
+            self._similarities[start:stop] = tile.ravel()
+        else:
+            first, last = np.searchsorted(self._pairs, (start, stop))
+            self._similarities[first:last] = tile.ravel()[
+                self._pairs[first:last] - start
+            ]
+        self._start += tile.shape[0]
+
+    def ranked(self) -> RankedSimilarities:
+        """Return the ranked similarities of the gathered pairs."""
+        return RankedSimilarities(self._similarities)
+
+
+def rank_similarities(
+    similarity_tiles: Iterable[np.ndarray],
+    shape: tuple[int, int],
+    pairs: Optional[np.ndarray],
+) -> RankedSimilarities:
+    """Return the ranked similarities of the pairs used by the rank correlations.
+
+    Parameters
+    ----------
+    similarity_tiles : Iterable[np.ndarray]
+        The tiles of the similarities, as blocks of consecutive
+        rows, starting from the first row.
+    shape : tuple[int, int]
+        The shape of the similarity matrix.
+    pairs : Optional[np.ndarray]
+        The sorted flat indices of the pairs used by the rank correlations,
+        or None to use all of the pairs.
+    """
+    gatherer = PairsGatherer(shape, pairs)
+    for tile in similarity_tiles:
+        gatherer.update(tile)
+    return gatherer.ranked()
+
+
+def rank_correlations(
+    fingerprint_ranks: list[RankedSimilarities],
+    spectral_ranks: list[RankedSimilarities],
+) -> list[list[list[tuple[str, float, float]]]]:
+    """Return the rank correlations between all of the ranked similarities.
+
+    Parameters
+    ----------
+    fingerprint_ranks : list[RankedSimilarities]
+        The ranked similarities of each fingerprint.
+    spectral_ranks : list[RankedSimilarities]
+        The ranked similarities of each spectral similarity.
+
+    Returns
+    -------
+    list[list[list[tuple[str, float, float]]]]
+        For each fingerprint and spectral similarity, the name,
+        correlation and p-value of Spearman and Kendall.
+    """
+    return [
+        [
+            [
+                ("Spearman", *fingerprint.spearman(spectral)),
+                ("Kendall", *fingerprint.kendall(spectral)),
+            ]
+            for spectral in spectral_ranks
+        ]
+        for fingerprint in fingerprint_ranks
+    ]
+
+
+class RankCache:
+    """Bounded cache of ranked similarities, evicting the least recently used.
+
+    The cache may be shared by the steps executed concurrently by the pipeline.
+    """
+
+    def __init__(self, maximal_size: int):
+        """Initialize the rank cache.
+
+        Parameters
+        ----------
+        maximal_size : int
+            The maximal number of ranked similarities kept in the cache.
+        """
+        self._maximal_size: int = maximal_size
+        self._ranks: OrderedDict[Hashable, RankedSimilarities] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[RankedSimilarities]:
+        """Return the ranked similarities cached under the key, if any."""
+        with self._lock:
+            if key not in self._ranks:
+                return None
+            self._ranks.move_to_end(key)
+            return self._ranks[key]
+
+    def store(self, key: Hashable, ranks: RankedSimilarities) -> None:
+        """Cache the ranked similarities under the key."""
+        with self._lock:
+            self._ranks[key] = ranks
+            self._ranks.move_to_end(key)
+            while len(self._ranks) > self._maximal_size:
+                self._ranks.popitem(last=False)
@@ -50,6 +50,13 @@ class GNPSDataset(Dataset):
         self._apparatus: str = apparatus
         self._all_spectra: list[Spectrum] = []
 
+    def _sources(self) -> list[str]:
+        """Return the paths of the files the GNPS spectra are loaded from."""
+        return [
+            os.path.join(self.directory, "matchms.mgf"),
+            os.path.join(self.directory, "lotus_metadata.csv.gz"),
+        ]
+
     def _load_spectra(self) -> None:
         """Load the GNPS dataset."""
         downloader = BaseDownloader(
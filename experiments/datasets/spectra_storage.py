@@ -0,0 +1,124 @@
+"""Submodule providing a compact on-disk form of the filtered spectra of a dataset.
+
+Loading a dataset from its sources requires parsing and filtering all of its
+spectra, which is much slower than reading back the filtered spectra. We
+therefore store the peaks of all the spectra as contiguous arrays, together
+with their already harmonized metadata as JSON, so that a released dataset
+can be reloaded cheaply and without unpickling any object.
+"""
+
+from typing import Any, Optional
+import json
+import os
+import zipfile
+import numpy as np
+from matchms import Spectrum
+
+# Version of the stored form of the spectra, to be increased whenever the stored
+# form or the filtering of the spectra changes, so that stale files are not reused.
+SPECTRA_STORAGE_VERSION: int = 2
+
+# Bytes of the Python objects of a spectrum besides its peaks, including its
+# metadata, used to estimate the memory held by the spectra of a dataset.
+SPECTRUM_OVERHEAD_BYTES: int = 4096
+
+
+def source_fingerprint(path: str) -> Optional[tuple[str, int, int]]:
+    """Return the name, size and modification time of a source file, if it exists."""
+    if not os.path.exists(path):
+        return None
+    status: os.stat_result = os.stat(path)
+    return os.path.basename(path), status.st_size, status.st_mtime_ns
+
+
+def _to_json(value: Any) -> Any:
+    """Return the JSON serializable form of the NumPy values of the metadata."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Unsupported metadata value of type {type(value).__name__}.")
+
+
+def store_spectra(spectra: list[Spectrum], path: str) -> None:
+    """Store the spectra in the provided '.npz' file.
+
+    Parameters
+    ----------
+    spectra : list[Spectrum]
+        The spectra to store.
+    path : str
+        The path of the '.npz' file, which is written atomically.
+    """
+    directory: str = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    offsets: np.ndarray = np.zeros(len(spectra) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(spectrum.peaks.mz) for spectrum in spectra])
+    metadata: np.ndarray = np.frombuffer(
+        json.dumps(
+            [dict(spectrum.metadata) for spectrum in spectra], default=_to_json
+        ).encode("utf8"),
+        dtype=np.uint8,
+    )
+
+    # We write to a temporary file first, so that an interrupted
+    # write never leaves a truncated file behind.
+    temporary_path: str = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(
+            file,
+            mz=np.concatenate(
+                [spectrum.peaks.mz for spectrum in spectra] or [np.empty(0)]
+            ),
+            intensities=np.concatenate(
+                [spectrum.peaks.intensities for spectrum in spectra] or [np.empty(0)]
+            ),
+            offsets=offsets,
+            metadata=metadata,
+        )
+    os.replace(temporary_path, path)
+
+
+def load_stored_spectra(path: str) -> list[Spectrum]:
+    """Return the spectra stored in the provided '.npz' file."""
+    with np.load(path, allow_pickle=False) as stored:
+        mz: np.ndarray = stored["mz"]
+        intensities: np.ndarray = stored["intensities"]
+        offsets: np.ndarray = stored["offsets"]
+        metadata: list[dict] = json.loads(stored["metadata"].tobytes().decode("utf8"))
+
+    return [
+        Spectrum(
+            mz=mz[start:stop],
+            intensities=intensities[start:stop],
+            metadata=spectrum_metadata,
+            metadata_harmonization=False,
+        )
+        for start, stop, spectrum_metadata in zip(offsets[:-1], offsets[1:], metadata)
+    ]
+
+
+def spectra_size(spectra: list[Spectrum]) -> tuple[int, int]:
+    """Return the number of spectra and an estimate of their bytes in memory."""
+    peaks_bytes: int = sum(
+        spectrum.peaks.mz.nbytes + spectrum.peaks.intensities.nbytes
+        for spectrum in spectra
+    )
+    return len(spectra), peaks_bytes + len(spectra) * SPECTRUM_OVERHEAD_BYTES
+
+
+def stored_spectra_size(path: str) -> tuple[int, int]:
+    """Return the number of spectra stored in the '.npz' file and an estimate of their bytes in memory.
+
+    Only the offsets of the spectra are read, while the bytes of the
+    peaks are taken from the sizes of the arrays within the archive.
+    """
+    with np.load(path, allow_pickle=False) as stored:
+        number_of_spectra: int = stored["offsets"].size - 1
+    with zipfile.ZipFile(path) as archive:
+        peaks_bytes: int = sum(
+            archive.getinfo(f"{name}.npy").file_size for name in ("mz", "intensities")
+        )
+    return number_of_spectra, peaks_bytes + number_of_spectra * SPECTRUM_OVERHEAD_BYTES
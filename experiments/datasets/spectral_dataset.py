@@ -1,9 +1,20 @@
 """Submodule defining the interface for a spectral dataset."""
 
+from typing import Optional
 from abc import abstractmethod
+import os
+import matchms
 from matchms import Spectrum
 import numpy as np
 from dict_hash import Hashable, sha256
+from experiments.datasets.spectra_storage import (
+    SPECTRA_STORAGE_VERSION,
+    load_stored_spectra,
+    source_fingerprint,
+    spectra_size,
+    store_spectra,
+    stored_spectra_size,
+)
 
 
 class Dataset(Hashable):
@@ -33,12 +44,62 @@ class Dataset(Hashable):
     def _load_spectra(self) -> list[Spectrum]:
         """Return the spectra in the dataset."""
 
+    def _sources(self) -> list[str]:
+        """Return the paths of the source files the spectra are loaded from."""
+        return []
+
+    def _stored_spectra_path(self) -> str:
+        """Return the path of the compact on-disk form of the spectra.
+
+        Besides the dataset, the path depends on the version of the stored
+        form, on the version of MatchMS filtering the spectra and on the size
+        and modification time of the source files, so that the spectra stored
+        before any of them changed are not reused.
+        """
+        key: str = sha256(
+            {
+                "dataset": self.to_dict(),
+                "storage_version": SPECTRA_STORAGE_VERSION,
+                "matchms_version": matchms.__version__,
+                "sources": [source_fingerprint(path) for path in self._sources()],
+            }
+        )
+        return os.path.join(self.directory, "spectra", f"{key}.npz")
+
     def spectra(self) -> list[Spectrum]:
-        """Return the spectra in the dataset."""
+        """Return the spectra in the dataset.
+
+        The first time the spectra are loaded, they are also stored in a
+        compact on-disk form, from which they are cheaply reloaded after
+        being released.
+        """
         if not self._spectra:
-            self._spectra = self._load_spectra()
+            path: str = self._stored_spectra_path()
+            if os.path.exists(path):
+                self._spectra = load_stored_spectra(path)
+            else:
+                self._spectra = self._load_spectra()
+                # The source files may have just been downloaded.
+                store_spectra(self._spectra, self._stored_spectra_path())
         return self._spectra
 
+    def spectra_size(self) -> Optional[tuple[int, int]]:
+        """Return the number of spectra and an estimate of their bytes in memory.
+
+        When the spectra are not loaded, the size is read from their stored
+        form, and None is returned when they have not been stored yet.
+        """
+        if self._spectra:
+            return spectra_size(self._spectra)
+        path: str = self._stored_spectra_path()
+        if os.path.exists(path):
+            return stored_spectra_size(path)
+        return None
+
+    def release(self) -> None:
+        """Release the spectra held in memory, which are reloaded when needed."""
+        self._spectra = []
+
     @abstractmethod
     def tolerance(self) -> float:
         """Return the tolerance of the dataset."""
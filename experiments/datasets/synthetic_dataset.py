@@ -11,6 +11,10 @@ from experiments.datasets.spectral_dataset import Dataset
 class SyntheticDataset(Dataset):
     """Implementation of the SpectralDataset class for the synthetic dataset."""
 
+    def _sources(self) -> list[str]:
+        """Return the paths of the files the synthetic spectra are loaded from."""
+        return [os.path.join(self.directory, "isdb_pos_cleaned.pkl")]
+
     def _load_spectra(self) -> list[Spectrum]:
         """Load the synthetic dataset."""
         downloader = BaseDownloader(
@@ -23,3 +23,89 @@ class UnknownApparatus(ExperimentError):
         super().__init__(
             f"Unknown apparatus: {apparatus}: we only support 'orbitrap', 'qtof' and 'all'."
         )
+
+
+class InvalidMemorySize(ExperimentError, ValueError):
+    """Exception raised when a memory size cannot be parsed."""
+
+    def __init__(self, memory_size: str):
+        """Initialize the InvalidMemorySizeError."""
+        super().__init__(
+            f"Invalid memory size: {memory_size}: we expect a number optionally "
+            "followed by a unit such as 'B', 'MB', 'GB', 'MiB' or 'GiB'."
+        )
+
+
+class InsufficientMemoryBudget(ExperimentError):
+    """Exception raised when the memory budget cannot fit a single tile."""
+
+    def __init__(self, max_memory: int, required_memory: int):
+        """Initialize the InsufficientMemoryBudgetError."""
+        super().__init__(
+            f"Insufficient memory budget: {max_memory} bytes were provided, "
+            f"but at least {required_memory} bytes are required."
+        )
+
+
+class UnknownIterationMode(ExperimentError):
+    """Exception raised when an Unknown iteration mode is provided."""
+
+    def __init__(self, iteration_mode: str):
+        """Initialize the UnknownIterationModeError."""
+        super().__init__(
+            f"Unknown iteration mode: {iteration_mode}: we only support "
+            "'resample', 'subsample' and 'bootstrap'."
+        )
+
+
+class InvalidPoolQuantity(ExperimentError):
+    """Exception raised when the pool is too small for the iteration mode."""
+
+    def __init__(self, pool_quantity: int, quantity: int, iteration_mode: str):
+        """Initialize the InvalidPoolQuantityError."""
+        comparison = "larger than" if iteration_mode == "subsample" else "at least"
+        super().__init__(
+            f"Invalid pool quantity: {pool_quantity}: in the '{iteration_mode}' "
+            f"iteration mode the pool must be {comparison} the quantity {quantity}."
+        )
+
+
+class InvalidPrecursorMz(ExperimentError):
+    """Exception raised when a spectrum lacks a valid precursor m/z."""
+
+    def __init__(self, precursor_mz):
+        """Initialize the InvalidPrecursorMzError."""
+        super().__init__(
+            f"Invalid precursor m/z: {precursor_mz}: we expect a positive number. "
+            "Apply the 'add_precursor_mz' and 'require_precursor_mz' filters first."
+        )
+
+
+class InvalidConvergenceCriterion(ExperimentError, ValueError):
+    """Exception raised when the convergence criterion is not valid."""
+
+    def __init__(self, reason: str):
+        """Initialize the InvalidConvergenceCriterionError."""
+        super().__init__(f"Invalid convergence criterion: {reason}.")
+
+
+class InvalidTolerances(ExperimentError, ValueError):
+    """Exception raised when the tolerances of a similarity measure are not valid."""
+
+    def __init__(self, tolerances):
+        """Initialize the InvalidTolerancesError."""
+        super().__init__(
+            f"Invalid tolerances: {tolerances}: we expect a positive number "
+            "or a non-empty list of distinct positive numbers."
+        )
+
+
+class MissingStepResults(ExperimentError):
+    """Exception raised when no stored step results match the report."""
+
+    def __init__(self, directory: str):
+        """Initialize the MissingStepResultsError."""
+        super().__init__(
+            f"Missing step results: no stored step in '{directory}' matches "
+            "the provided filters: run the experiment first."
+        )
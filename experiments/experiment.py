@@ -1,113 +1,508 @@
 """Main loop of the experiment."""
 
-from typing import Type
+from typing import Optional, Type
+from concurrent.futures import Future
+from multiprocessing.pool import Pool as ProcessPool
+import logging
 import os
+import silence_tensorflow.auto  # pylint: disable=unused-import
 from cache_decorator import Cache
 import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm, trange
 from matchms import Spectrum
-from scipy.stats import pearsonr, spearmanr, kendalltau
-from barplots import barplots
 from experiments.datasets import Dataset, GNPSDataset, SyntheticDataset
 from experiments.spectral_similarities import (
     SpectralSimilarity,
-    CosineGreedy,
-    NeutralLossesCosine,
-    ModifiedCosine,
+    CosineFamily,
+    BinnedCosine,
     MS2DeepScore,
     WeightedMassSpecEntropy,
     UnweightedMassSpecEntropy,
 )
-from experiments.molecular_similarities import all_fingerprints, jaccard
+from experiments.molecular_similarities import (
+    FINGERPRINT_SIZE,
+    FINGERPRINT_TRANSFORMERS,
+    all_fingerprints,
+    tiled_jaccard,
+    unique_structures,
+)
+from experiments.memory_budget import MemoryBudget, MemoryPlan
+from experiments.memory_mapping import scratch_space, scratch_path
+from experiments.correlations import (
+    PairsGatherer,
+    PearsonAccumulator,
+    RankCache,
+    RankedSimilarities,
+    bootstrap_pairs,
+    rank_correlations,
+    rank_similarities,
+    sample_pairs,
+)
+from experiments.convergence import ConvergenceCriterion, count_iterations
+from experiments.pipeline import (
+    STAGE_THREADS,
+    Pipeline,
+    PipelineStages,
+    StepSample,
+    sample_step,
+)
+from experiments.random_states import step_random_state
+from experiments.report import plot_results
+from experiments.exceptions import UnknownIterationMode, InvalidPoolQuantity
+
+logger = logging.getLogger(__name__)
+
+
+def _correlation_rows(
+    dataset: Type[Dataset],
+    fingerprint_names: list[str],
+    similarity_measure: Type[SpectralSimilarity],
+    pearson_correlations: list[list[tuple[float, float]]],
+    fingerprint_rank_correlations: list[list[list[tuple[str, float, float]]]],
+) -> list[dict]:
+    """Return the result rows of the correlations of each fingerprint and similarity."""
+    results: list[dict] = []
+    for fingerprint_name, fingerprint_pearson, similarities_rank_correlations in zip(
+        fingerprint_names, pearson_correlations, fingerprint_rank_correlations
+    ):
+        for similarity_name, pearson, similarity_rank_correlations in zip(
+            similarity_measure.similarity_names(),
+            fingerprint_pearson,
+            similarities_rank_correlations,
+        ):
+            for correlation_method_name, correlation, p_value in [
+                ("Pearson", *pearson),
+                *similarity_rank_correlations,
+            ]:
+                results.append(
+                    {
+                        "dataset": dataset.name(),
+                        "fingerprint": fingerprint_name,
+                        "spectral_similarity": similarity_name,
+                        "correlation_method": correlation_method_name,
+                        "correlation": correlation,
+                        "p_value": p_value,
+                    }
+                )
+    return results
+
+
+def _correlate_step(
+    dataset: Type[Dataset],
+    similarity_measure: Type[SpectralSimilarity],
+    memory_plan: MemoryPlan,
+    quantity: int,
+    random_state: int,
+    verbose: bool,
+    scratch: Optional[str],
+    rank_cache: RankCache,
+    sample: StepSample,
+    spectral_similarities: np.ndarray,
+) -> list[dict]:
+    """Return the result rows of the correlations of a step."""
+    rows: list[Spectrum] = sample.rows
+    columns: list[Spectrum] = sample.columns
+    rows_structures: np.ndarray = sample.rows_structures
+    columns_structures: np.ndarray = sample.columns_structures
+    structures_fingerprints: dict[str, np.ndarray] = sample.structures_fingerprints
+
+    shape: tuple[int, int] = (len(rows), len(columns))
+    spectral_layers: np.ndarray = spectral_similarities.reshape(-1, *shape)
+
+    pairs: Optional[np.ndarray] = sample_pairs(
+        len(rows) * len(columns),
+        memory_plan.rank_correlation_pairs,
+        random_state,
+    )
+
+    # The spectral similarities are ranked once and correlated with
+    # all of the fingerprints, and vice versa.
+    spectral_ranks: list[RankedSimilarities] = [
+        rank_similarities(
+            (
+                spectral_layer[start : start + memory_plan.jaccard_tile_size]
+                for start in range(0, len(rows), memory_plan.jaccard_tile_size)
+            ),
+            shape,
+            pairs,
+        )
+        for spectral_layer in spectral_layers
+    ]
+
+    pearson_correlations: list[list[tuple[float, float]]] = []
+    fingerprint_ranks: list[RankedSimilarities] = []
+
+    for fingerprint_name, structures_fingerprint in tqdm(
+        structures_fingerprints.items(),
+        desc="Fingerprints",
+        unit="fingerprint",
+        dynamic_ncols=True,
+        leave=False,
+        total=len(structures_fingerprints),
+        disable=not verbose,
+    ):
+        # The Jaccard similarities are computed between the unique structures,
+        # and the tiles of the sample are gathered through their indices.
+        structures_similarities: np.ndarray = tiled_jaccard(
+            structures_fingerprint,
+            structures_fingerprint,
+            tile_size=memory_plan.structures_tile_size,
+            path=scratch_path(scratch, "fingerprint_similarities"),
+        )
+
+        # The Jaccard similarities of the step do not depend on the spectral
+        # similarity measure, so their ranks are shared across the measures.
+        rank_key: tuple = (
+            dataset.name(),
+            fingerprint_name,
+            quantity,
+            random_state,
+            memory_plan.rank_correlation_pairs,
+        )
+        ranks: Optional[RankedSimilarities] = rank_cache.get(rank_key)
+        gatherer: Optional[PairsGatherer] = (
+            PairsGatherer(shape, pairs) if ranks is None else None
+        )
+        accumulators: list[PearsonAccumulator] = [
+            PearsonAccumulator() for _ in spectral_layers
+        ]
+        for start in range(0, len(rows), memory_plan.jaccard_tile_size):
+            stop: int = start + memory_plan.jaccard_tile_size
+            fingerprint_tile: np.ndarray = structures_similarities[
+                np.ix_(rows_structures[start:stop], columns_structures)
+            ]
+            for accumulator, spectral_layer in zip(accumulators, spectral_layers):
+                accumulator.update(fingerprint_tile, spectral_layer[start:stop])
+            if gatherer is not None:
+                gatherer.update(fingerprint_tile)
+
+        if gatherer is not None:
+            ranks = gatherer.ranked()
+            rank_cache.store(rank_key, ranks)
+        pearson_correlations.append(
+            [accumulator.correlation() for accumulator in accumulators]
+        )
+        fingerprint_ranks.append(ranks)
+
+    return _correlation_rows(
+        dataset,
+        list(structures_fingerprints),
+        similarity_measure,
+        pearson_correlations,
+        rank_correlations(fingerprint_ranks, spectral_ranks),
+    )
 
 
 @Cache(
     cache_path="results/{_hash}.csv",
     use_approximated_hash=True,
-    args_to_ignore=["cache", "verbose", "n_jobs"],
+    args_to_ignore=[
+        "cache",
+        "verbose",
+        "n_jobs",
+        "scratch_directory",
+        "rank_cache",
+        "sample",
+        "stages",
+        "processes",
+    ],
     enable_cache_arg_name="cache",
     capture_enable_cache_arg_name=False,
 )
 def experiment_step(
     dataset: Type[Dataset],
     similarity_measure: Type[SpectralSimilarity],
+    memory_plan: MemoryPlan,
     quantity: int,
     random_state: int,
     verbose: bool,
     n_jobs: int,
     cache: bool,  # pylint: disable=unused-argument
+    scratch_directory: Optional[str] = None,
+    rank_cache: Optional[RankCache] = None,
+    sample: Optional[StepSample] = None,
+    stages: Optional[PipelineStages] = None,
+    processes: Optional[ProcessPool] = None,
 ) -> pd.DataFrame:
-    """Executes a single step of the experiment."""
-    rows: list[Spectrum] = dataset.sample_spectra(quantity, random_state)
-    columns: list[Spectrum] = dataset.sample_spectra(quantity, random_state)
+    """Executes a single step of the experiment.
+
+    Parameters
+    ----------
+    rank_cache : Optional[RankCache]
+        The cache of the ranked Jaccard similarities, shared by the steps
+        of the different spectral similarity measures on the same sample.
+    sample : Optional[StepSample]
+        The sample of the step, with the fingerprints of its structures,
+        when already prepared by the pipeline. It is determined by the
+        dataset, the quantity and the random state.
+    stages : Optional[PipelineStages]
+        The locks of the stages of the steps, shared by the steps executed
+        concurrently by the pipeline.
+    processes : Optional[ProcessPool]
+        The pool of processes shared by the stages of the pipeline.
+        By default, each stage starts its own pool of processes.
+    """
+    if rank_cache is None:
+        rank_cache = RankCache(maximal_size=len(FINGERPRINT_TRANSFORMERS))
+    if sample is None:
+        sample = sample_step(
+            dataset, quantity, random_state, verbose, n_jobs, processes
+        )
+    if stages is None:
+        stages = PipelineStages()
+
+    with scratch_space(scratch_directory) as scratch:
+        with stages.spectral:
+            spectral_similarities: np.ndarray = similarity_measure.transform(
+                sample.rows,
+                sample.columns,
+                tile_size=memory_plan.spectral_tile_size,
+                path=scratch_path(scratch, "spectral_similarities"),
+                pool=processes,
+            )
+
+        # The step waits here for the previous one to be correlated, holding
+        # its spectral similarities while the next step computes its own.
+        with stages.correlation:
+            results: list[dict] = _correlate_step(
+                dataset=dataset,
+                similarity_measure=similarity_measure,
+                memory_plan=memory_plan,
+                quantity=quantity,
+                random_state=random_state,
+                verbose=verbose,
+                scratch=scratch,
+                rank_cache=rank_cache,
+                sample=sample,
+                spectral_similarities=spectral_similarities,
+            )
+
+    return pd.DataFrame(results)
 
-    rows_smiles: list[str] = [spectrum.get("smiles") for spectrum in rows]
-    columns_smiles: list[str] = [spectrum.get("smiles") for spectrum in columns]
 
-    rows_fingerprints: dict[str, np.ndarray] = all_fingerprints(
-        rows_smiles, verbose=verbose, n_jobs=n_jobs
+@Cache(
+    cache_path="results/{_hash}.csv",
+    use_approximated_hash=True,
+    args_to_ignore=["cache", "verbose", "n_jobs", "scratch_directory", "processes"],
+    enable_cache_arg_name="cache",
+    capture_enable_cache_arg_name=False,
+)
+def pooled_experiment_steps(
+    dataset: Type[Dataset],
+    similarity_measure: Type[SpectralSimilarity],
+    memory_plan: MemoryPlan,
+    quantity: int,
+    pool_quantity: int,
+    iterations: int,
+    iteration_mode: str,
+    random_state: int,
+    verbose: bool,
+    n_jobs: int,
+    cache: bool,  # pylint: disable=unused-argument
+    scratch_directory: Optional[str] = None,
+    convergence: Optional[ConvergenceCriterion] = None,
+    processes: Optional[ProcessPool] = None,
+) -> pd.DataFrame:
+    """Executes all the iterations of the experiment on subsamples of a single pool.
+
+    The spectral and Jaccard similarities are computed once over a pool of
+    spectra, and each iteration gathers the similarities of a subsample of
+    the pool. In the 'subsample' iteration mode, each iteration draws spectra
+    from the pool without replacement and uses all of the pairs between them.
+    In the 'bootstrap' iteration mode, each iteration draws as many pairs as
+    a step has, independently and with replacement, from the pairs of the
+    pool. When a convergence criterion is provided, the iterations stop as
+    soon as it is met. The pool of processes, if provided, is the one shared
+    by the stages of the pipeline.
+    """
+    pool: list[Spectrum] = dataset.sample_spectra(pool_quantity, random_state)
+
+    structures, pool_structures = unique_structures(
+        [spectrum.get("smiles") for spectrum in pool]
     )
-    columns_fingerprints: dict[str, np.ndarray] = all_fingerprints(
-        columns_smiles, verbose=verbose, n_jobs=n_jobs
+    structures_fingerprints: dict[str, np.ndarray] = all_fingerprints(
+        structures, verbose=verbose, n_jobs=n_jobs, pool=processes
     )
 
-    spectral_similarities: np.ndarray = similarity_measure.transform(rows, columns)
+    rng = np.random.default_rng(random_state)
+    iterations_indices: list[Optional[np.ndarray]] = [
+        (
+            np.sort(rng.choice(pool_quantity, size=quantity, replace=False))
+            if iteration_mode == "subsample"
+            else None
+        )
+        for _ in range(iterations)
+    ]
 
     results: list[dict] = []
 
-    for fingerprint_name, rows_fingerprint in tqdm(
-        rows_fingerprints.items(),
-        desc="Fingerprints",
-        unit="fingerprint",
-        dynamic_ncols=True,
-        leave=False,
-        total=len(rows_fingerprints),
-        disable=not verbose,
-    ):
-        fingerprint_similarity = jaccard(
-            rows_fingerprint,
-            columns_fingerprints[fingerprint_name],
+    with scratch_space(scratch_directory) as scratch:
+        pool_spectral_similarities: np.ndarray = similarity_measure.transform(
+            pool,
+            pool,
+            tile_size=memory_plan.spectral_tile_size,
+            path=scratch_path(scratch, "spectral_similarities"),
+            pool=processes,
         )
-        for correlation_method_name, correlation_method in tqdm(
-            (
-                ("Pearson", pearsonr),
-                ("Spearman", spearmanr),
-                ("Kendall", kendalltau),
-            ),
-            desc="Correlation",
-            unit="correlation method",
-            dynamic_ncols=True,
-            leave=False,
-            disable=not verbose,
+        spectral_layers: np.ndarray = pool_spectral_similarities.reshape(
+            -1, pool_quantity, pool_quantity
+        )
+
+        # The Jaccard similarities are computed between the unique structures
+        # of the pool, once the spectral similarities of the pool are done.
+        structures_similarities: dict[str, np.ndarray] = {
+            fingerprint_name: tiled_jaccard(
+                structures_fingerprint,
+                structures_fingerprint,
+                tile_size=memory_plan.structures_tile_size,
+                path=scratch_path(scratch, f"fingerprint_similarities_{number}"),
+            )
+            for number, (fingerprint_name, structures_fingerprint) in enumerate(
+                structures_fingerprints.items()
+            )
+        }
+
+        shape: tuple[int, int] = (quantity, quantity)
+
+        for iteration, indices in enumerate(
+            tqdm(
+                iterations_indices,
+                desc="Iterations",
+                unit="iteration",
+                dynamic_ncols=True,
+                leave=False,
+                disable=not verbose,
+            )
         ):
-            correlation, p_value = correlation_method(
-                fingerprint_similarity.flatten(), spectral_similarities.flatten()
+            pairs: Optional[np.ndarray] = sample_pairs(
+                quantity**2,
+                memory_plan.rank_correlation_pairs,
+                (random_state * (iteration + 1)) % 2**32,
             )
-            results.append(
-                {
-                    "dataset": dataset.name(),
-                    "fingerprint": fingerprint_name,
-                    "spectral_similarity": similarity_measure.name(),
-                    "correlation_method": correlation_method_name,
-                    "correlation": correlation,
-                    "p_value": p_value,
-                }
+
+            def tiles_indices(
+                indices: Optional[np.ndarray] = indices, iteration: int = iteration
+            ):
+                """Yield the indices of each tile in the pool and in its structures."""
+                for start in range(0, quantity, memory_plan.jaccard_tile_size):
+                    stop: int = min(start + memory_plan.jaccard_tile_size, quantity)
+                    if indices is None:
+                        rows, columns = bootstrap_pairs(
+                            pool_quantity,
+                            quantity,
+                            range(start, stop),
+                            (random_state, iteration),
+                        )
+                        yield (rows, columns), (
+                            pool_structures[rows],
+                            pool_structures[columns],
+                        )
+                    else:
+                        yield np.ix_(indices[start:stop], indices), np.ix_(
+                            pool_structures[indices[start:stop]],
+                            pool_structures[indices],
+                        )
+
+            spectral_ranks: list[RankedSimilarities] = [
+                rank_similarities(
+                    (
+                        spectral_layer[tile_indices]
+                        for tile_indices, _ in tiles_indices()
+                    ),
+                    shape,
+                    pairs,
+                )
+                for spectral_layer in spectral_layers
+            ]
+
+            pearson_correlations: list[list[tuple[float, float]]] = []
+            fingerprint_ranks: list[RankedSimilarities] = []
+            for fingerprint_similarities in structures_similarities.values():
+                gatherer = PairsGatherer(shape, pairs)
+                accumulators: list[PearsonAccumulator] = [
+                    PearsonAccumulator() for _ in spectral_layers
+                ]
+                for tile_indices, tile_structures in tiles_indices():
+                    fingerprint_tile: np.ndarray = fingerprint_similarities[
+                        tile_structures
+                    ]
+                    for accumulator, spectral_layer in zip(
+                        accumulators, spectral_layers
+                    ):
+                        accumulator.update(
+                            fingerprint_tile, spectral_layer[tile_indices]
+                        )
+                    gatherer.update(fingerprint_tile)
+                pearson_correlations.append(
+                    [accumulator.correlation() for accumulator in accumulators]
+                )
+                fingerprint_ranks.append(gatherer.ranked())
+
+            results.extend(
+                _correlation_rows(
+                    dataset,
+                    list(structures_similarities),
+                    similarity_measure,
+                    pearson_correlations,
+                    rank_correlations(fingerprint_ranks, spectral_ranks),
+                )
             )
 
+            if convergence is not None and convergence.converged(pd.DataFrame(results)):
+                break
+
     return pd.DataFrame(results)
 
 
-def experiment(
-    iterations: int,
+def _submit_sample(
+    pipeline: Pipeline,
+    dataset: Type[Dataset],
+    similarity_measures: list[Type[SpectralSimilarity]],
+    memory_plans: list[MemoryPlan],
+    running: list[int],
     quantity: int,
     random_state: int,
-    directory: str,
-    n_jobs: int,
     verbose: bool,
+    n_jobs: int,
     cache: bool,
-) -> pd.DataFrame:
-    """Executes the experiment."""
+) -> Optional[Future]:
+    """Submit the preparation of the sample of the steps to the pipeline.
+
+    When the steps of all the running similarity measures are already cached,
+    their sample is not needed and None is returned instead.
+    """
+    if cache and all(
+        os.path.exists(
+            Cache.compute_path(
+                experiment_step,
+                dataset=dataset,
+                similarity_measure=similarity_measures[index],
+                memory_plan=memory_plans[index],
+                quantity=quantity,
+                random_state=random_state,
+                verbose=verbose,
+                n_jobs=n_jobs,
+                cache=cache,
+            )
+        )
+        for index in running
+    ):
+        return None
+    return pipeline.submit(
+        "samples",
+        sample_step,
+        dataset,
+        quantity,
+        random_state,
+        verbose,
+        n_jobs,
+        pipeline.processes,
+    )
+
+
+def default_datasets(directory: str, verbose: bool) -> list[Type[Dataset]]:
+    """Return the datasets the experiment is executed on by default."""
     datasets: list[Type[Dataset]] = [
         SyntheticDataset(directory=directory, verbose=verbose),
     ]
@@ -125,86 +520,321 @@ def experiment(
                     )
                 )
 
-    results: list[pd.DataFrame] = []
+    return datasets
 
-    for dataset in tqdm(
-        datasets,
-        desc="Datasets",
-        unit="dataset",
-        dynamic_ncols=True,
-        leave=False,
-        disable=not verbose,
+
+def experiment(
+    iterations: int,
+    quantity: int,
+    random_state: int,
+    directory: str,
+    n_jobs: int,
+    verbose: bool,
+    cache: bool,
+    max_memory: Optional[int] = None,
+    iteration_mode: str = "resample",
+    pool_quantity: Optional[int] = None,
+    scratch_directory: Optional[str] = None,
+    convergence: Optional[ConvergenceCriterion] = None,
+    tolerance_factors: Optional[list[float]] = None,
+    pipelined: bool = True,
+    sample_rank_pairs: bool = False,
+    datasets: Optional[list[Type[Dataset]]] = None,
+) -> pd.DataFrame:
+    """Executes the experiment.
+
+    Parameters
+    ----------
+    iterations : int
+        The number of iterations of each similarity measure on each dataset,
+        or their maximal number when a convergence criterion is provided.
+    iteration_mode : str
+        How the iterations are sampled. In the 'resample' mode, every iteration
+        samples new spectra and recomputes all of the similarities. In the
+        'subsample' and 'bootstrap' modes, the similarities are computed once
+        over a pool of spectra. Each iteration then subsamples the spectra of
+        the pool without replacement in the 'subsample' mode, and bootstraps
+        the pairs of the pool in the 'bootstrap' mode.
+    pool_quantity : Optional[int]
+        The number of spectra in the pool of the 'subsample' and 'bootstrap'
+        modes. By default, it is twice the quantity when subsampling and
+        equal to the quantity when bootstrapping.
+    scratch_directory : Optional[str]
+        The directory, ideally on fast local storage, where the similarity
+        matrices are stored as memory-mapped files. By default, the
+        similarity matrices are kept in memory.
+    convergence : Optional[ConvergenceCriterion]
+        The criterion stopping the iterations of a similarity measure on a
+        dataset once its correlation estimates converge. The number of
+        iterations used by each of them is reported in the 'iterations'
+        column of the results. By default, all the iterations are executed.
+    tolerance_factors : Optional[list[float]]
+        The factors the tolerance of each dataset is multiplied by to obtain
+        the tolerances of the peak matching measures. The similarities at
+        all of the tolerances are computed in a single pass and reported as
+        separate spectral similarities. By default, only the tolerance of
+        each dataset is used.
+    pipelined : bool
+        Whether to overlap the stages of the experiment. When pipelined, the
+        next dataset is loaded and the sample of the next iteration is
+        fingerprinted while the current step computes its spectral similarities,
+        and the previous step is correlated at the same time. The memory budget
+        then bounds all of the stages in flight, which only shrinks the tiles,
+        so that the results are the same as those of the sequential experiment.
+        The next dataset is only loaded ahead when its size is known.
+    sample_rank_pairs : bool
+        Whether Spearman and Kendall may be estimated on a random subset of
+        the pairs when the ranks of all of the pairs do not fit in the memory
+        budget. By default, such a budget is reported as insufficient.
+    datasets : Optional[list[Type[Dataset]]]
+        The datasets the experiment is executed on. By default, the synthetic
+        dataset and the subsets of GNPS returned by default_datasets.
+    """
+    if iteration_mode not in ("resample", "subsample", "bootstrap"):
+        raise UnknownIterationMode(iteration_mode)
+
+    if pool_quantity is None:
+        pool_quantity = 2 * quantity if iteration_mode == "subsample" else quantity
+
+    if pool_quantity < quantity or (
+        iteration_mode == "subsample" and pool_quantity == quantity
     ):
-        similarity_measures: list[Type[SpectralSimilarity]] = [
-            CosineGreedy(tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs),
-            NeutralLossesCosine(
-                tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs
-            ),
-            ModifiedCosine(
-                tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs
-            ),
-            MS2DeepScore(directory=directory, verbose=verbose, n_jobs=n_jobs),
-            UnweightedMassSpecEntropy(
-                tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs
-            ),
-            WeightedMassSpecEntropy(
-                tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs
-            ),
-        ]
-        for similarity_measure in tqdm(
-            similarity_measures,
-            desc=f"Similarities on '{dataset.name()}'",
-            unit="similarity measure",
-            dynamic_ncols=True,
-            leave=False,
-            disable=not verbose,
-        ):
-            for iteration in trange(
-                iterations,
-                desc=f"Iterations of '{similarity_measure.name()}' on '{dataset.name()}'",
-                unit="iteration",
+        raise InvalidPoolQuantity(pool_quantity, quantity, iteration_mode)
+
+    # In the 'resample' iteration mode the pipeline overlaps consecutive steps.
+    steps_in_flight: int = (
+        STAGE_THREADS["steps"] if pipelined and iteration_mode == "resample" else 1
+    )
+
+    memory_budget = MemoryBudget(
+        max_memory,
+        memory_mapped=scratch_directory is not None,
+        sample_rank_pairs=sample_rank_pairs,
+    )
+
+    if datasets is None:
+        datasets = default_datasets(directory, verbose)
+
+    results: list[pd.DataFrame] = []
+
+    fingerprint_bytes: int = len(FINGERPRINT_TRANSFORMERS) * FINGERPRINT_SIZE // 8
+    loading: Optional[Future] = None
+
+    with Pipeline(pipelined, n_jobs) as pipeline:
+        for number, dataset in enumerate(
+            tqdm(
+                datasets,
+                desc="Datasets",
+                unit="dataset",
                 dynamic_ncols=True,
                 leave=False,
                 disable=not verbose,
-            ):
-                results.append(
-                    experiment_step(
-                        dataset=dataset,
-                        similarity_measure=similarity_measure,
-                        quantity=quantity,
-                        random_state=(random_state * (iteration + 1)) % 2**32,
-                        verbose=verbose,
-                        n_jobs=n_jobs,
-                        cache=cache,
+            )
+        ):
+            # The next dataset is loaded while the steps of the current one run,
+            # when its size is known so that it is accounted for by the budget.
+            if loading is not None:
+                loading.result()
+                loading = None
+            prefetched_bytes: int = 0
+            if pipelined and number + 1 < len(datasets):
+                next_dataset_size: Optional[tuple[int, int]] = datasets[
+                    number + 1
+                ].spectra_size()
+                if next_dataset_size is not None or max_memory is None:
+                    loading = pipeline.submit("datasets", datasets[number + 1].spectra)
+                    if next_dataset_size is not None:
+                        prefetched_bytes = next_dataset_size[1]
+
+            tolerances: list[float] = [
+                dataset.tolerance() * factor for factor in tolerance_factors or [1.0]
+            ]
+            similarity_measures: list[Type[SpectralSimilarity]] = [
+                CosineFamily(tolerance=tolerances, verbose=verbose, n_jobs=n_jobs),
+                BinnedCosine(
+                    tolerance=dataset.tolerance(), verbose=verbose, n_jobs=n_jobs
+                ),
+                MS2DeepScore(directory=directory, verbose=verbose, n_jobs=n_jobs),
+                UnweightedMassSpecEntropy(
+                    tolerance=tolerances, verbose=verbose, n_jobs=n_jobs
+                ),
+                WeightedMassSpecEntropy(
+                    tolerance=tolerances, verbose=verbose, n_jobs=n_jobs
+                ),
+            ]
+            # The spectra of the dataset are loaded to measure them only when
+            # they have not been stored yet, as they are needed by the steps.
+            dataset_size: Optional[tuple[int, int]] = dataset.spectra_size()
+            if dataset_size is None:
+                dataset.spectra()
+                dataset_size = dataset.spectra_size()
+            number_of_spectra, dataset_bytes = dataset_size
+
+            memory_plans: list[MemoryPlan] = []
+            for similarity_measure in similarity_measures:
+                memory_plan: MemoryPlan = memory_budget.plan(
+                    number_of_rows=quantity,
+                    number_of_columns=quantity,
+                    fingerprint_bytes=fingerprint_bytes,
+                    n_jobs=n_jobs,
+                    pool_size=None if iteration_mode == "resample" else pool_quantity,
+                    number_of_similarities=len(similarity_measure.similarity_names()),
+                    number_of_fingerprints=len(FINGERPRINT_TRANSFORMERS),
+                    dataset_bytes=dataset_bytes,
+                    spectrum_bytes=-(-dataset_bytes // max(number_of_spectra, 1)),
+                    steps_in_flight=steps_in_flight,
+                    prefetched_bytes=prefetched_bytes,
+                )
+                logger.info(
+                    "Memory plan of '%s' on '%s': %s",
+                    similarity_measure.name(),
+                    dataset.name(),
+                    memory_plan,
+                )
+                memory_plans.append(memory_plan)
+
+            measures_results: list[list[pd.DataFrame]] = [
+                [] for _ in similarity_measures
+            ]
+
+            if iteration_mode != "resample":
+                for similarity_measure, memory_plan, measure_results in tqdm(
+                    zip(similarity_measures, memory_plans, measures_results),
+                    desc=f"Similarities on '{dataset.name()}'",
+                    unit="similarity measure",
+                    dynamic_ncols=True,
+                    leave=False,
+                    total=len(similarity_measures),
+                    disable=not verbose,
+                ):
+                    measure_results.append(
+                        pooled_experiment_steps(
+                            dataset=dataset,
+                            similarity_measure=similarity_measure,
+                            memory_plan=memory_plan,
+                            quantity=quantity,
+                            pool_quantity=pool_quantity,
+                            iterations=iterations,
+                            iteration_mode=iteration_mode,
+                            random_state=random_state,
+                            verbose=verbose,
+                            n_jobs=n_jobs,
+                            cache=cache,
+                            scratch_directory=scratch_directory,
+                            convergence=convergence,
+                            processes=pipeline.processes,
+                        )
                     )
+            else:
+                # The similarity measures are evaluated one iteration at a time, so
+                # that the ranked Jaccard similarities of each sample are shared among
+                # them, and the measures whose estimates converged are left out.
+                rank_cache = RankCache(maximal_size=len(FINGERPRINT_TRANSFORMERS))
+                running: list[int] = list(range(len(similarity_measures)))
+                sample: Optional[Future] = _submit_sample(
+                    pipeline,
+                    dataset,
+                    similarity_measures,
+                    memory_plans,
+                    running,
+                    quantity,
+                    step_random_state(random_state, 0),
+                    verbose,
+                    n_jobs,
+                    cache,
                 )
 
-    results = pd.concat(results)
+                for iteration in trange(
+                    iterations,
+                    desc=f"Iterations on '{dataset.name()}'",
+                    unit="iteration",
+                    dynamic_ncols=True,
+                    leave=False,
+                    disable=not verbose,
+                ):
+                    step_sample: Optional[StepSample] = (
+                        None if sample is None else sample.result()
+                    )
+                    # The sample of the next iteration is prepared while the
+                    # steps of the current one run.
+                    sample = (
+                        _submit_sample(
+                            pipeline,
+                            dataset,
+                            similarity_measures,
+                            memory_plans,
+                            running,
+                            quantity,
+                            step_random_state(random_state, iteration + 1),
+                            verbose,
+                            n_jobs,
+                            cache,
+                        )
+                        if iteration + 1 < iterations
+                        else None
+                    )
+                    steps: list[tuple[int, Future]] = [
+                        (
+                            index,
+                            pipeline.submit(
+                                "steps",
+                                experiment_step,
+                                dataset=dataset,
+                                similarity_measure=similarity_measures[index],
+                                memory_plan=memory_plans[index],
+                                quantity=quantity,
+                                random_state=step_random_state(random_state, iteration),
+                                verbose=verbose,
+                                n_jobs=n_jobs,
+                                cache=cache,
+                                scratch_directory=scratch_directory,
+                                rank_cache=rank_cache,
+                                sample=step_sample,
+                                stages=pipeline.stages,
+                                processes=pipeline.processes,
+                            ),
+                        )
+                        for index in running
+                    ]
+                    for index, step in steps:
+                        measures_results[index].append(step.result())
 
-    for fingerprint_name, fingerprint_results in results.groupby("fingerprint"):
-        fingerprint_results["dataset"] = [
-            dataset.replace("Positives", "Pos")
-            .replace("Negatives", "Neg")
-            .replace("Orbitrap", "OT")
-            for dataset in fingerprint_results["dataset"]
-        ]
+                    if convergence is not None:
+                        running = [
+                            index
+                            for index in running
+                            if not convergence.converged(
+                                pd.concat(measures_results[index])
+                            )
+                        ]
+                        if not running:
+                            break
 
-        barplots(
-            fingerprint_results.drop(columns=["p_value"]),
-            path=os.path.join(
-                "barplots", fingerprint_name.replace(" ", "_").lower(), "{feature}.png"
-            ),
-            groupby=[
-                "correlation_method",
-                "dataset",
-                "spectral_similarity",
-            ],
-            unique_minor_labels=False,
-            orientation="horizontal",
-            height=6,
-            bar_width=0.1,
-            space_width=0.15,
-            subplots=True,
-        )
+                # The sample prepared for an iteration skipped by the convergence
+                # is waited for, as it reads the spectra of the dataset.
+                if sample is not None:
+                    sample.result()
+
+            for similarity_measure, measure_results in zip(
+                similarity_measures, measures_results
+            ):
+                cell_results: pd.DataFrame = pd.concat(measure_results)
+                cell_results["iterations"] = count_iterations(cell_results)
+                logger.info(
+                    "Executed %d iterations of '%s' on '%s'",
+                    cell_results["iterations"].iloc[0],
+                    similarity_measure.name(),
+                    dataset.name(),
+                )
+                results.append(cell_results)
+
+            # The spectra of the dataset are released once all of its steps are
+            # done, so that at most the current and the next dataset are resident
+            # in memory at a time.
+            dataset.release()
+
+    results = pd.concat(results)
+
+    plot_results(results)
 
     return results
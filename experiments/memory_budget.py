@@ -0,0 +1,429 @@
+"""Submodule providing the memory budget used to tile the experimental pipeline."""
+
+from typing import Optional
+import re
+from dict_hash import Hashable, sha256
+from experiments.exceptions import InvalidMemorySize, InsufficientMemoryBudget
+
+# Size in bytes of a cell of a similarity matrix, which we store as float32.
+SIMILARITY_CELL_BYTES: int = 4
+
+# Number of copies of a spectral tile alive at once for each tile in flight:
+# the one being filled in the worker, the pickled one in the result queue and
+# the unpickled one in the main process before it is copied in the output.
+SPECTRAL_TILE_COPIES: int = 3
+
+# Bytes per cell of a correlation tile: the float32 Jaccard and spectral tiles,
+# which are gathered or read from the memory-mapped matrices, plus their float64
+# centred copies used by the Pearson accumulator.
+CORRELATION_TILE_CELL_BYTES: int = 2 * SIMILARITY_CELL_BYTES + 2 * 8
+
+# Bytes per pair used by the rank correlations: the int64 index of the pair,
+# the float32 similarity gathered before ranking and the working memory of the
+# ranking and of the sorting executed by Kendall, plus the float64 standardized
+# ranks and the dense int64 ranks kept for each of the ranked similarities.
+RANK_PAIR_BYTES: int = 8 + SIMILARITY_CELL_BYTES + 52
+RANKED_PAIR_BYTES: int = 8 + 8
+
+# Bytes per cell of a correlation tile bootstrapped from a pool: the int64
+# indices in the pool of the rows and columns of its pairs, and of their structures.
+BOOTSTRAP_CELL_BYTES: int = 4 * 8
+
+# Number of copies of the columns of a spectral task held for each worker:
+# the pickled task waiting in the queue and the unpickled one being computed.
+COLUMNS_COPIES: int = 2
+
+# Bytes of a parsed molecule while it is fingerprinted, besides its fingerprint.
+MOLECULE_BYTES: int = 4096
+
+MEMORY_UNITS: dict[str, int] = {
+    "": 1,
+    "B": 1,
+    "KB": 10**3,
+    "MB": 10**6,
+    "GB": 10**9,
+    "TB": 10**12,
+    "KIB": 2**10,
+    "MIB": 2**20,
+    "GIB": 2**30,
+    "TIB": 2**40,
+}
+
+
+def parse_memory_size(memory_size: str) -> int:
+    """Return the number of bytes described by a string such as '16GB' or '512MiB'."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", memory_size)
+    if match is None or match.group(2).upper() not in MEMORY_UNITS:
+        raise InvalidMemorySize(memory_size)
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).upper()])
+
+
+def humanize_bytes(number_of_bytes: int) -> str:
+    """Return a human readable representation of the provided number of bytes."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if number_of_bytes < 1024:
+            return f"{number_of_bytes:.1f} {unit}"
+        number_of_bytes /= 1024
+    return f"{number_of_bytes:.1f} TiB"
+
+
+class MemoryPlan(Hashable):
+    """Tiling of the experimental pipeline chosen to fit in a memory budget."""
+
+    def __init__(
+        self,
+        spectral_tile_size: int,
+        jaccard_tile_size: int,
+        structures_tile_size: int,
+        rank_correlation_pairs: int,
+        number_of_pairs: int,
+        resident_bytes: int,
+        max_memory: Optional[int],
+        memory_mapped: bool = False,
+    ):
+        """Initialize the memory plan.
+
+        Parameters
+        ----------
+        spectral_tile_size : int
+            Number of rows computed by each task of the spectral similarities.
+        jaccard_tile_size : int
+            Number of rows of the Jaccard similarities computed at once.
+        structures_tile_size : int
+            Number of rows of the Jaccard similarities between the unique
+            structures of the sample or of the pool computed at once.
+        rank_correlation_pairs : int
+            Number of pairs used to compute the rank correlations.
+            When smaller than the number of pairs, a random subset of the
+            pairs is used to estimate Spearman and Kendall.
+        number_of_pairs : int
+            Total number of pairs in the similarity matrices.
+        resident_bytes : int
+            Bytes of the data that must stay resident during the step.
+        max_memory : Optional[int]
+            The memory budget in bytes, or None when unbounded.
+        memory_mapped : bool
+            Whether the similarity matrices are backed by memory-mapped files.
+        """
+        self._spectral_tile_size: int = spectral_tile_size
+        self._jaccard_tile_size: int = jaccard_tile_size
+        self._structures_tile_size: int = structures_tile_size
+        self._rank_correlation_pairs: int = rank_correlation_pairs
+        self._number_of_pairs: int = number_of_pairs
+        self._resident_bytes: int = resident_bytes
+        self._max_memory: Optional[int] = max_memory
+        self._memory_mapped: bool = memory_mapped
+
+    @property
+    def spectral_tile_size(self) -> int:
+        """Return the number of rows computed by each spectral similarity task."""
+        return self._spectral_tile_size
+
+    @property
+    def jaccard_tile_size(self) -> int:
+        """Return the number of rows of the Jaccard similarities computed at once."""
+        return self._jaccard_tile_size
+
+    @property
+    def structures_tile_size(self) -> int:
+        """Return the number of rows of the structures similarities computed at once."""
+        return self._structures_tile_size
+
+    @property
+    def rank_correlation_pairs(self) -> int:
+        """Return the number of pairs used to compute the rank correlations."""
+        return self._rank_correlation_pairs
+
+    @property
+    def samples_rank_correlations(self) -> bool:
+        """Return whether the rank correlations are estimated on a subset of the pairs."""
+        return self._rank_correlation_pairs < self._number_of_pairs
+
+    def __str__(self) -> str:
+        """Return a description of the memory plan."""
+        budget = (
+            "unbounded"
+            if self._max_memory is None
+            else humanize_bytes(self._max_memory)
+        )
+        return (
+            f"budget {budget}, "
+            f"{'memory-mapped' if self._memory_mapped else 'in-memory'} matrices, "
+            f"resident data {humanize_bytes(self._resident_bytes)}, "
+            f"spectral tiles of {self._spectral_tile_size} rows, "
+            f"Jaccard tiles of {self._jaccard_tile_size} rows, "
+            f"structures tiles of {self._structures_tile_size} rows, "
+            f"rank correlations on {self._rank_correlation_pairs} "
+            f"of {self._number_of_pairs} pairs"
+        )
+
+    def to_dict(self) -> dict:
+        """Return the parts of the memory plan that affect the results."""
+        return {
+            "rank_correlation_pairs": (
+                self._rank_correlation_pairs if self.samples_rank_correlations else None
+            ),
+        }
+
+    def consistent_hash(self, use_approximation: bool = False) -> str:
+        """Return a consistent hash of the memory plan."""
+        return sha256(self.to_dict(), use_approximation=use_approximation)
+
+
+class MemoryBudget:
+    """Memory budget used to choose the tiling of the experimental pipeline."""
+
+    def __init__(
+        self,
+        max_memory: Optional[int] = None,
+        memory_mapped: bool = False,
+        sample_rank_pairs: bool = False,
+    ):
+        """Initialize the memory budget.
+
+        Parameters
+        ----------
+        max_memory : Optional[int]
+            The maximal number of bytes the spectra of the dataset, the
+            similarity matrices, their tiles and the stages of a step may
+            use at once. When None, the whole matrices are computed at once.
+        memory_mapped : bool
+            Whether the similarity matrices are backed by memory-mapped files,
+            in which case they do not count towards the budget.
+        sample_rank_pairs : bool
+            Whether Spearman and Kendall may be estimated on a random subset
+            of the pairs when the ranks of all the pairs do not fit in the
+            budget. By default, a budget too small for them is insufficient.
+        """
+        self._max_memory: Optional[int] = max_memory
+        self._memory_mapped: bool = memory_mapped
+        self._sample_rank_pairs: bool = sample_rank_pairs
+
+    @property
+    def max_memory(self) -> Optional[int]:
+        """Return the memory budget in bytes."""
+        return self._max_memory
+
+    def plan(
+        self,
+        number_of_rows: int,
+        number_of_columns: int,
+        fingerprint_bytes: int,
+        n_jobs: int,
+        pool_size: Optional[int] = None,
+        number_of_similarities: int = 1,
+        number_of_fingerprints: int = 1,
+        dataset_bytes: int = 0,
+        spectrum_bytes: int = 0,
+        steps_in_flight: int = 1,
+        prefetched_bytes: int = 0,
+    ) -> MemoryPlan:
+        """Return the tiling of a step fitting the memory budget.
+
+        Parameters
+        ----------
+        number_of_rows : int
+            Number of rows of the similarity matrices.
+        number_of_columns : int
+            Number of columns of the similarity matrices.
+        fingerprint_bytes : int
+            Bytes of all the packed fingerprints of a single molecule.
+        n_jobs : int
+            Number of processes computing the spectral similarities.
+        pool_size : Optional[int]
+            Number of spectra of the pool the iterations are subsampled from,
+            when the similarities are computed once over a pool.
+        number_of_similarities : int
+            Number of spectral similarity matrices computed at once by the measure.
+        number_of_fingerprints : int
+            Number of fingerprints whose Jaccard similarities are correlated.
+        dataset_bytes : int
+            Bytes of the spectra of the dataset, which stay resident during
+            the step and which the samples refer to.
+        spectrum_bytes : int
+            Mean bytes of a spectrum, as copied to each of the workers
+            computing the spectral similarities.
+        steps_in_flight : int
+            Number of steps whose data are resident at once. When larger than
+            one, the steps are pipelined: the spectral similarities of a step
+            are computed while another step is correlated and the sample of
+            the next step is fingerprinted, and the tiles of the two stages
+            split the memory left by all of them.
+        prefetched_bytes : int
+            Bytes of the spectra of the next dataset, loaded during the step.
+
+        The number of pairs used by the rank correlations, which affects the
+        results, only depends on the memory available to a single step, so
+        that pipelining and prefetching only change the sizes of the tiles.
+
+        Raises
+        ------
+        InsufficientMemoryBudget
+            If any of the stages of the step does not fit in the budget.
+        """
+        number_of_pairs: int = number_of_rows * number_of_columns
+
+        if pool_size is None:
+            kernel_rows: int = number_of_rows
+            kernel_columns: int = number_of_columns
+            number_of_molecules: int = number_of_rows + number_of_columns
+            resident_bytes: int = number_of_molecules * fingerprint_bytes
+            # The Jaccard similarities between the unique structures of the
+            # sample, which are at most as many as the spectra, stay resident
+            # while their tiles are gathered.
+            if not self._memory_mapped:
+                resident_bytes += (
+                    (number_of_similarities + 1)
+                    * number_of_pairs
+                    * SIMILARITY_CELL_BYTES
+                )
+        else:
+            # The spectral and Jaccard similarities of the pool stay resident
+            # while the iterations gather their tiles.
+            kernel_rows = kernel_columns = number_of_molecules = pool_size
+            resident_bytes = pool_size * fingerprint_bytes
+            if not self._memory_mapped:
+                resident_bytes += (
+                    (number_of_similarities + number_of_fingerprints)
+                    * pool_size**2
+                    * SIMILARITY_CELL_BYTES
+                )
+        step_bytes: int = resident_bytes
+        resident_bytes += dataset_bytes
+
+        row_bytes: int = number_of_similarities * kernel_columns * SIMILARITY_CELL_BYTES
+        # The ranks of all the spectral and Jaccard similarities are kept
+        # until the rank correlations between all of them are computed.
+        rank_pair_bytes: int = (
+            RANK_PAIR_BYTES
+            + (number_of_similarities + number_of_fingerprints) * RANKED_PAIR_BYTES
+        )
+
+        # When the matrices are memory-mapped, the workers write their tiles
+        # directly into the mapped files, so no copies are kept in flight.
+        spectral_tile_copies: int = 1 if self._memory_mapped else SPECTRAL_TILE_COPIES
+
+        # The tiles gathered from a pool also hold the indices of their pairs.
+        correlation_cell_bytes: int = CORRELATION_TILE_CELL_BYTES + (
+            0 if pool_size is None else BOOTSTRAP_CELL_BYTES
+        )
+
+        # Each worker of the spectral stage holds copies of all of the columns,
+        # and each worker of the fingerprinting stage parses its molecules and
+        # unpacks one of their fingerprints at a time.
+        columns_bytes: int = n_jobs * COLUMNS_COPIES * kernel_columns * spectrum_bytes
+        fingerprinting_bytes: int = number_of_molecules * (
+            MOLECULE_BYTES + 8 * fingerprint_bytes // max(number_of_fingerprints, 1)
+        )
+
+        if self._max_memory is None:
+            return MemoryPlan(
+                spectral_tile_size=max(-(-kernel_rows // n_jobs), 1),
+                jaccard_tile_size=max(number_of_rows, 1),
+                structures_tile_size=max(kernel_rows, 1),
+                rank_correlation_pairs=number_of_pairs,
+                number_of_pairs=number_of_pairs,
+                resident_bytes=resident_bytes,
+                max_memory=None,
+                memory_mapped=self._memory_mapped,
+            )
+
+        available: int = self._max_memory - resident_bytes
+
+        # Unless the pairs may be sampled, all of them are ranked, and otherwise
+        # they take half of the memory available to a single step.
+        rank_correlation_pairs: int = (
+            min(available // 2 // rank_pair_bytes, number_of_pairs)
+            if self._sample_rank_pairs
+            else number_of_pairs
+        )
+        ranks_bytes: int = rank_correlation_pairs * rank_pair_bytes
+
+        if steps_in_flight > 1:
+            # The spectral stage of a step, the correlation stage of another,
+            # with its ranks, and the fingerprinting of the next sample run at
+            # once, and the tiles of the two stages split what is left.
+            overlapped_bytes: int = (
+                prefetched_bytes
+                + (steps_in_flight - 1) * step_bytes
+                + fingerprinting_bytes
+                + number_of_molecules * fingerprint_bytes
+                + columns_bytes
+                + ranks_bytes
+            )
+            tiles_bytes: int = (available - overlapped_bytes) // 2
+            spectral_available: int = columns_bytes + tiles_bytes
+            correlation_available: int = ranks_bytes + tiles_bytes
+        else:
+            # The stages of the step run one after the other, while the
+            # next dataset is loaded.
+            overlapped_bytes = prefetched_bytes + fingerprinting_bytes
+            spectral_available = correlation_available = available - prefetched_bytes
+
+        # We keep two spectral tiles per worker in flight,
+        # as the pool prefetches the next task.
+        spectral_tile_size: int = min(
+            (spectral_available - columns_bytes)
+            // (2 * n_jobs * spectral_tile_copies * row_bytes),
+            -(-kernel_rows // n_jobs),
+        )
+
+        # The Jaccard tiles are alive at the same time as the ranked pairs.
+        jaccard_tile_size: int = min(
+            (correlation_available - ranks_bytes)
+            // (number_of_columns * correlation_cell_bytes),
+            number_of_rows,
+        )
+
+        # The Jaccard similarities between the unique structures of a sample,
+        # which are at most as many as its spectra, are computed while the
+        # spectral ranks are kept, while those of a pool are computed before
+        # any of the iterations ranks its similarities.
+        structures_tile_size: int = min(
+            (correlation_available - (0 if pool_size is not None else ranks_bytes))
+            // (kernel_columns * SIMILARITY_CELL_BYTES),
+            kernel_rows,
+        )
+
+        if (
+            min(
+                spectral_tile_size,
+                jaccard_tile_size,
+                structures_tile_size,
+                rank_correlation_pairs,
+            )
+            < 1
+            or overlapped_bytes > available
+        ):
+            spectral_bytes: int = (
+                columns_bytes + 2 * n_jobs * spectral_tile_copies * row_bytes
+            )
+            correlation_bytes: int = (
+                max(rank_correlation_pairs, 1) * rank_pair_bytes
+                + number_of_columns * correlation_cell_bytes
+            )
+            raise InsufficientMemoryBudget(
+                max_memory=self._max_memory,
+                required_memory=resident_bytes
+                + (
+                    overlapped_bytes
+                    - columns_bytes
+                    - ranks_bytes
+                    + spectral_bytes
+                    + correlation_bytes
+                    if steps_in_flight > 1
+                    else prefetched_bytes
+                    + max(fingerprinting_bytes, spectral_bytes, correlation_bytes)
+                ),
+            )
+
+        return MemoryPlan(
+            spectral_tile_size=spectral_tile_size,
+            jaccard_tile_size=jaccard_tile_size,
+            structures_tile_size=structures_tile_size,
+            rank_correlation_pairs=rank_correlation_pairs,
+            number_of_pairs=number_of_pairs,
+            resident_bytes=resident_bytes,
+            max_memory=self._max_memory,
+            memory_mapped=self._memory_mapped,
+        )
@@ -0,0 +1,46 @@
+"""Submodule providing utilities to back similarity matrices with memory-mapped files."""
+
+from typing import Iterator, Optional
+from contextlib import contextmanager
+from tempfile import TemporaryDirectory
+import os
+import numpy as np
+
+
+def allocate_similarities(shape: tuple[int, ...], path: Optional[str]) -> np.ndarray:
+    """Return a zeroed float32 similarity matrix, memory-mapped when a path is provided.
+
+    Parameters
+    ----------
+    shape : tuple[int, ...]
+        The shape of the similarity matrix, or of the stack of matrices.
+    path : Optional[str]
+        The path of the '.npy' file backing the matrix, or None
+        to allocate the matrix in memory.
+    """
+    if path is None:
+        return np.zeros(shape, dtype=np.float32)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+
+
+@contextmanager
+def scratch_space(scratch_directory: Optional[str]) -> Iterator[Optional[str]]:
+    """Yield a temporary directory within the scratch directory, or None without one.
+
+    The temporary directory and the memory-mapped matrices it contains
+    are removed once the context is left.
+    """
+    if scratch_directory is None:
+        yield None
+        return
+
+    os.makedirs(scratch_directory, exist_ok=True)
+    with TemporaryDirectory(dir=scratch_directory) as directory:
+        yield directory
+
+
+def scratch_path(directory: Optional[str], name: str) -> Optional[str]:
+    """Return the path of the named matrix within the scratch space, if any."""
+    if directory is None:
+        return None
+    return os.path.join(directory, f"{name}.npy")
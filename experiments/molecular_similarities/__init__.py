@@ -1,19 +1,44 @@
 """Submodule defining utilities for molecular similarities."""
 
-from typing import List, Tuple, Type
+from typing import List, Optional, Tuple, Type
+from contextlib import nullcontext
+from multiprocessing import Pool
+from multiprocessing.pool import Pool as ProcessPool
 from numba import njit, prange
 import numpy as np
 from tqdm.auto import tqdm
+from rdkit.Chem import Mol
 from skfp.bases import BaseFingerprintTransformer
+from skfp.utils.validators import ensure_mols
 from skfp.fingerprints.ecfp import ECFPFingerprint
 from skfp.fingerprints.avalon import AvalonFingerprint
 from skfp.fingerprints.layered import LayeredFingerprint
 from skfp.fingerprints.rdkit_fp import RDKitFingerprint
+from experiments.memory_mapping import allocate_similarities
 
+FINGERPRINT_SIZE: int = 2048
 
-@njit(parallel=True)
+FINGERPRINT_TRANSFORMERS: tuple[Type[BaseFingerprintTransformer], ...] = (
+    ECFPFingerprint,
+    AvalonFingerprint,
+    LayeredFingerprint,
+    RDKitFingerprint,
+)
+
+
+# Number of set bits of each byte, used to count the equal bits of packed fingerprints.
+_POPCOUNT: np.ndarray = np.array(
+    [bin(byte).count("1") for byte in range(256)], dtype=np.uint8
+)
+
+
+@njit(parallel=True, nogil=True)
 def jaccard(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
-    """Calculate the similarities between the rows and columns of the fingerprints."""
+    """Calculate the similarities between the rows and columns of the packed fingerprints.
+
+    The similarity is the fraction of equal bits, which we count from the
+    set bits of the exclusive or of the bytes of the packed fingerprints.
+    """
     similarity = np.zeros(
         (
             rows.shape[0],
@@ -21,41 +46,112 @@ def jaccard(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
         ),
         dtype=np.float32,
     )
+    number_of_bits = rows.shape[1] * 8
     for i in prange(rows.shape[0]):  # pylint: disable=not-an-iterable
         row = rows[i]
         for j in range(columns.shape[0]):
             column = columns[j]
+            different_bits = 0
             for k in range(row.shape[0]):
-                if row[k] == column[k]:
-                    similarity[i, j] += 1
-            similarity[i, j] /= row.shape[0]
+                different_bits += _POPCOUNT[row[k] ^ column[k]]
+            similarity[i, j] = (number_of_bits - different_bits) / number_of_bits
+    return similarity
+
+
+def tiled_jaccard(
+    rows: np.ndarray, columns: np.ndarray, tile_size: int, path: Optional[str] = None
+) -> np.ndarray:
+    """Calculate the similarities tile by tile, optionally into a memory-mapped file."""
+    similarity: np.ndarray = allocate_similarities(
+        (rows.shape[0], columns.shape[0]), path
+    )
+    for start in range(0, rows.shape[0], tile_size):
+        similarity[start : start + tile_size] = jaccard(
+            rows[start : start + tile_size], columns
+        )
     return similarity
 
 
+def unique_structures(smiles: list[str]) -> tuple[list[str], np.ndarray]:
+    """Return the unique SMILES and the index of the unique SMILES of each of the provided ones.
+
+    Since several spectra often share the same structure, the molecular
+    similarities are computed once per unique structure and the ones of
+    the spectra are gathered through their index.
+    """
+    unique_smiles, indices = np.unique(
+        np.array(smiles, dtype=object), return_inverse=True
+    )
+    return unique_smiles.tolist(), indices.astype(np.intp, copy=False)
+
+
+def _chunk_fingerprints(smiles: list[str]) -> list[np.ndarray]:
+    """Return the packed fingerprints of the chunk of SMILES, parsed only once."""
+    molecules: list[Mol] = ensure_mols(smiles)
+    return [
+        np.packbits(
+            fingerprint_transformer(
+                fp_size=FINGERPRINT_SIZE, verbose=False, n_jobs=1
+            ).fit_transform(molecules),
+            axis=1,
+        )
+        for fingerprint_transformer in FINGERPRINT_TRANSFORMERS
+    ]
+
+
 def all_fingerprints(
-    smiles: list[str], verbose: bool, n_jobs: int
+    smiles: list[str],
+    verbose: bool,
+    n_jobs: int,
+    pool: Optional[ProcessPool] = None,
 ) -> dict[str, np.ndarray]:
-    """Computes all predefined fingerprints for the given SMILES."""
-    fingerprints: list[Type[BaseFingerprintTransformer]] = [
-        ECFPFingerprint(fp_size=2048, verbose=False, n_jobs=n_jobs),
-        AvalonFingerprint(fp_size=2048, verbose=False, n_jobs=n_jobs),
-        LayeredFingerprint(fp_size=2048, verbose=False, n_jobs=n_jobs),
-        RDKitFingerprint(fp_size=2048, verbose=False, n_jobs=n_jobs),
+    """Computes all predefined fingerprints for the given SMILES.
+
+    The SMILES are split in chunks, and each process parses the molecules of
+    its chunks once and computes all of the fingerprints from them. The
+    fingerprints are returned packed, with eight bits per byte. The chunks
+    are computed by the provided pool of processes, if any, and otherwise
+    by a pool of processes started for the purpose.
+    """
+    chunk_size: int = max(-(-len(smiles) // n_jobs), 1)
+    chunks: list[list[str]] = [
+        smiles[start : start + chunk_size]
+        for start in range(0, len(smiles), chunk_size)
     ]
 
-    fingerprint_matrices: dict[str, np.ndarray] = {}
-
-    for fingerprint in tqdm(
-        fingerprints,
-        desc="Fingerprints",
-        unit="fingerprint",
-        dynamic_ncols=True,
-        leave=False,
-        total=len(fingerprints),
-        disable=not verbose,
-    ):
-        fingerprint_matrices[fingerprint.__class__.__name__] = (
-            fingerprint.fit_transform(smiles)
+    if len(chunks) <= 1:
+        # A single chunk is computed in the current process,
+        # sparing the start of a pool of processes.
+        chunks_fingerprints: list[list[np.ndarray]] = [
+            _chunk_fingerprints(chunk) for chunk in chunks
+        ]
+    else:
+        processes = (
+            Pool(min(n_jobs, len(chunks))) if pool is None else nullcontext(pool)
         )
+        with processes as pool:
+            chunks_fingerprints = list(
+                tqdm(
+                    pool.imap(_chunk_fingerprints, chunks),
+                    desc="Fingerprints",
+                    unit="chunk",
+                    dynamic_ncols=True,
+                    leave=False,
+                    total=len(chunks),
+                    disable=not verbose,
+                )
+            )
 
-    return fingerprint_matrices
+    return {
+        fingerprint_transformer.__name__: (
+            np.concatenate(
+                [
+                    chunk_fingerprints[index]
+                    for chunk_fingerprints in chunks_fingerprints
+                ]
+            )
+            if chunks_fingerprints
+            else np.zeros((0, FINGERPRINT_SIZE // 8), dtype=np.uint8)
+        )
+        for index, fingerprint_transformer in enumerate(FINGERPRINT_TRANSFORMERS)
+    }
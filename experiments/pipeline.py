@@ -0,0 +1,204 @@
+"""Submodule providing the stages overlapped by the pipelined experiment.
+
+The steps of the experiment go through three stages: the sampling of the
+spectra and the fingerprinting of their structures, the computation of the
+spectral similarities and the correlation of the similarities. In the
+pipelined experiment, each stage is executed by its own pool of threads,
+so that the next dataset is loaded and the sample of the next iteration is
+fingerprinted while the spectral similarities of the current step are
+computed, and the previous step is correlated at the same time. The heavy
+work of each stage runs in process pools or in native code, which leaves
+the threads free to overlap.
+
+All of the processes are forked once by the main thread when the pipeline
+starts, as forking from the threads of the stages is not safe, and the
+stages then share them.
+"""
+
+from typing import Callable, Optional, Type
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Pool
+from multiprocessing.pool import Pool as ProcessPool
+from threading import Lock
+import numpy as np
+from matchms import Spectrum
+from experiments.datasets import Dataset
+from experiments.molecular_similarities import all_fingerprints, unique_structures
+
+# Number of threads of each stage of the pipeline. The steps are executed by
+# two threads, so that a step is correlated while the next one computes its
+# spectral similarities, which bounds the steps in flight to two.
+STAGE_THREADS: dict[str, int] = {
+    "datasets": 1,
+    "samples": 1,
+    "steps": 2,
+}
+
+
+class StepSample:
+    """Sample of spectra of a step, together with the fingerprints of its structures."""
+
+    def __init__(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        structures_indices: np.ndarray,
+        structures_fingerprints: dict[str, np.ndarray],
+    ):
+        """Initialize the sample of a step.
+
+        Parameters
+        ----------
+        rows : list[Spectrum]
+            The spectra used as rows of the similarity matrices.
+        columns : list[Spectrum]
+            The spectra used as columns of the similarity matrices.
+        structures_indices : np.ndarray
+            The index of the unique structure of each of the rows and columns.
+        structures_fingerprints : dict[str, np.ndarray]
+            The packed fingerprints of the unique structures, by fingerprint name.
+        """
+        self._rows: list[Spectrum] = rows
+        self._columns: list[Spectrum] = columns
+        self._structures_indices: np.ndarray = structures_indices
+        self._structures_fingerprints: dict[str, np.ndarray] = structures_fingerprints
+
+    @property
+    def rows(self) -> list[Spectrum]:
+        """Return the spectra used as rows of the similarity matrices."""
+        return self._rows
+
+    @property
+    def columns(self) -> list[Spectrum]:
+        """Return the spectra used as columns of the similarity matrices."""
+        return self._columns
+
+    @property
+    def rows_structures(self) -> np.ndarray:
+        """Return the index of the unique structure of each of the rows."""
+        return self._structures_indices[: len(self._rows)]
+
+    @property
+    def columns_structures(self) -> np.ndarray:
+        """Return the index of the unique structure of each of the columns."""
+        return self._structures_indices[len(self._rows) :]
+
+    @property
+    def structures_fingerprints(self) -> dict[str, np.ndarray]:
+        """Return the packed fingerprints of the unique structures."""
+        return self._structures_fingerprints
+
+
+def sample_step(
+    dataset: Type[Dataset],
+    quantity: int,
+    random_state: int,
+    verbose: bool,
+    n_jobs: int,
+    pool: Optional[ProcessPool] = None,
+) -> StepSample:
+    """Return the sample of spectra of a step, with the fingerprints of its structures."""
+    rows: list[Spectrum] = dataset.sample_spectra(quantity, random_state)
+    columns: list[Spectrum] = dataset.sample_spectra(quantity, random_state)
+
+    structures, structures_indices = unique_structures(
+        [spectrum.get("smiles") for spectrum in rows + columns]
+    )
+    return StepSample(
+        rows,
+        columns,
+        structures_indices,
+        all_fingerprints(structures, verbose=verbose, n_jobs=n_jobs, pool=pool),
+    )
+
+
+class PipelineStages:
+    """Locks of the stages of a step, each of which is executed by one step at a time.
+
+    The spectral similarities use all of the processes, and the correlations
+    keep the similarities of their step resident, so running a single step
+    per stage overlaps consecutive steps without oversubscribing the cores.
+    """
+
+    def __init__(self):
+        """Initialize the locks of the stages."""
+        self._spectral: Lock = Lock()
+        self._correlation: Lock = Lock()
+
+    @property
+    def spectral(self) -> Lock:
+        """Return the lock of the computation of the spectral similarities."""
+        return self._spectral
+
+    @property
+    def correlation(self) -> Lock:
+        """Return the lock of the correlation of the similarities."""
+        return self._correlation
+
+
+class Pipeline:
+    """Pools of threads executing each of the stages of the experiment."""
+
+    def __init__(self, pipelined: bool, n_jobs: int):
+        """Initialize the pipeline.
+
+        Parameters
+        ----------
+        pipelined : bool
+            Whether the stages are overlapped. When False, the submitted
+            tasks are executed immediately in the calling thread, and the
+            stages start their own pools of processes as needed.
+        n_jobs : int
+            The number of processes shared by the stages when pipelined.
+        """
+        # The processes are forked before any of the threads of the stages starts.
+        self._processes: Optional[ProcessPool] = Pool(n_jobs) if pipelined else None
+        self._executors: dict[str, ThreadPoolExecutor] = (
+            {
+                stage: ThreadPoolExecutor(
+                    max_workers=threads, thread_name_prefix=f"experiment-{stage}"
+                )
+                for stage, threads in STAGE_THREADS.items()
+            }
+            if pipelined
+            else {}
+        )
+        self._stages: PipelineStages = PipelineStages()
+
+    @property
+    def processes(self) -> Optional[ProcessPool]:
+        """Return the pool of processes shared by the stages, if pipelined."""
+        return self._processes
+
+    @property
+    def stages(self) -> PipelineStages:
+        """Return the locks of the stages of the steps."""
+        return self._stages
+
+    def submit(self, stage: str, function: Callable, *args, **kwargs) -> Future:
+        """Submit the task to the threads of the stage, and return its future."""
+        if stage in self._executors:
+            return self._executors[stage].submit(function, *args, **kwargs)
+
+        future: Future = Future()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as exception:  # pylint: disable=broad-except
+            future.set_exception(exception)
+        return future
+
+    def shutdown(self) -> None:
+        """Wait for the running tasks, cancel the pending ones and release the workers."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.terminate()
+            self._processes.join()
+
+    def __enter__(self) -> "Pipeline":
+        """Return the pipeline."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Shut down the pipeline."""
+        self.shutdown()
@@ -0,0 +1,52 @@
+"""Submodule providing the random states of the steps of the experiment.
+
+The step of each iteration of the 'resample' mode is stored with its own random
+state, derived from the random state of the experiment. The report inverts the
+derivation to find the stored steps of an experiment, so this submodule does
+not depend on any of the scoring libraries.
+"""
+
+from typing import Optional
+
+RANDOM_STATES: int = 2**32
+
+
+def step_random_state(random_state: int, iteration: int) -> int:
+    """Return the random state of the steps of the iteration."""
+    return (random_state * (iteration + 1)) % RANDOM_STATES
+
+
+def step_iteration(random_state: int, random_state_of_step: int) -> Optional[int]:
+    """Return the first iteration whose steps have the provided random state.
+
+    Parameters
+    ----------
+    random_state : int
+        The random state of the experiment.
+    random_state_of_step : int
+        The random state of a stored step.
+
+    Returns
+    -------
+    Optional[int]
+        The first iteration of the experiment whose steps have the random
+        state, or None when none of its iterations has it.
+    """
+    # The steps have the random states multiple of the random state of the
+    # experiment, modulo 2**32. Since the random state of the experiment is
+    # invertible once its factors of two are removed, we solve for the
+    # smallest positive multiple yielding the random state of the step.
+    random_state %= RANDOM_STATES
+    random_state_of_step %= RANDOM_STATES
+    if random_state == 0:
+        return 0 if random_state_of_step == 0 else None
+    factors_of_two: int = (random_state & -random_state).bit_length() - 1
+    if random_state_of_step % 2**factors_of_two != 0:
+        return None
+    modulus: int = RANDOM_STATES >> factors_of_two
+    multiple: int = (
+        (random_state_of_step >> factors_of_two)
+        * pow(random_state >> factors_of_two, -1, modulus)
+    ) % modulus
+    # A multiple of zero is equivalent to the multiple equal to the modulus.
+    return (multiple or modulus) - 1
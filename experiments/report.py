@@ -0,0 +1,271 @@
+"""Submodule providing the report of the stored results of the experiment.
+
+Each step of the experiment stores its correlations in the results directory,
+so the results and their barplots can be regenerated from the stored files
+alone, without building the datasets and the similarity measures again. This
+submodule only depends on the tabular and plotting libraries, so that the
+report does not import any of the scoring libraries.
+"""
+
+from typing import Optional
+from io import StringIO
+import json
+import os
+import pandas as pd
+from barplots import barplots
+from experiments.convergence import CORRELATION_KEYS
+from experiments.exceptions import MissingStepResults
+from experiments.random_states import step_iteration
+
+# Abbreviations of the words of the names of the datasets used in the barplots.
+DATASET_ABBREVIATIONS: dict[str, str] = {
+    "Positives": "Pos",
+    "Negatives": "Neg",
+    "Orbitrap": "OT",
+}
+
+
+def _step_metadata(path: str) -> tuple[Optional[str], dict]:
+    """Return the name of the function which stored the step and its parameters."""
+    try:
+        with open(f"{path}.metadata", "r", encoding="utf8") as metadata_file:
+            metadata: dict = json.load(metadata_file)
+    except FileNotFoundError:
+        return None, {}
+    return metadata.get("function_name"), metadata.get("parameters", {})
+
+
+def _resampled_iteration(
+    function_name: Optional[str], parameters: dict, random_state: Optional[int]
+) -> Optional[int]:
+    """Return the iteration of the experiment of a step of the 'resample' mode.
+
+    None is returned for the steps of the other modes, when no random state
+    is provided, or when the step is not one of the experiment.
+    """
+    if (
+        function_name != "experiment_step"
+        or random_state is None
+        or parameters.get("random_state") is None
+    ):
+        return None
+    return step_iteration(random_state, parameters["random_state"])
+
+
+def _matches_step(
+    function_name: Optional[str],
+    parameters: dict,
+    iteration: Optional[int],
+    quantity: Optional[int],
+    random_state: Optional[int],
+    iterations: Optional[int],
+    iteration_mode: Optional[str],
+) -> bool:
+    """Return whether the stored step matches the provided filters.
+
+    The steps of the 'resample' mode are stored one per iteration, with the
+    random state of their iteration, while the steps of the other modes are
+    stored with all of their iterations and the parameters of the experiment.
+    """
+    if quantity is not None and parameters.get("quantity") != quantity:
+        return False
+    if function_name == "experiment_step":
+        return iteration_mode in (None, "resample") and (
+            random_state is None
+            or iteration is not None
+            and (iterations is None or iteration < iterations)
+        )
+    return (
+        (iteration_mode is None or parameters.get("iteration_mode") == iteration_mode)
+        and (random_state is None or parameters.get("random_state") == random_state)
+        and (iterations is None or parameters.get("iterations") == iterations)
+    )
+
+
+def _matches_similarity(spectral_similarity: str, similarities: list[str]) -> bool:
+    """Return whether the spectral similarity is one of the provided ones.
+
+    The similarities computed at several tolerances match the name of their
+    similarity measure, such as 'Greedy Cosine (tolerance 0.05)' for 'Greedy Cosine'.
+    """
+    return any(
+        spectral_similarity == similarity
+        or spectral_similarity.startswith(f"{similarity} (tolerance ")
+        for similarity in similarities
+    )
+
+
+def load_results(
+    directory: str = "results",
+    quantity: Optional[int] = None,
+    datasets: Optional[list[str]] = None,
+    similarities: Optional[list[str]] = None,
+    fingerprints: Optional[list[str]] = None,
+    random_state: Optional[int] = None,
+    iterations: Optional[int] = None,
+    iteration_mode: Optional[str] = None,
+) -> pd.DataFrame:
+    """Return the results aggregated from the stored steps of the experiment.
+
+    Parameters
+    ----------
+    directory : str
+        The directory where the steps of the experiment stored their results.
+    quantity : Optional[int]
+        The number of spectra sampled by the steps to report.
+        By default, the steps of all quantities are reported.
+    datasets : Optional[list[str]]
+        The names of the datasets to report. By default, all of them.
+    similarities : Optional[list[str]]
+        The names of the spectral similarities to report, which also match
+        their variants computed at several tolerances. By default, all of them.
+    fingerprints : Optional[list[str]]
+        The names of the fingerprints to report. By default, all of them.
+    random_state : Optional[int]
+        The random state of the experiment to report. By default, the steps
+        of all the random states are reported.
+    iterations : Optional[int]
+        The number of iterations of the experiment to report. In the
+        'resample' mode, the steps of later iterations are left out, which
+        requires the random state. In the other modes, only the steps executed
+        with this number of iterations are reported. By default, all of them.
+    iteration_mode : Optional[str]
+        The iteration mode of the experiment to report. By default, the steps
+        of all the iteration modes are reported.
+
+    Raises
+    ------
+    MissingStepResults
+        If no stored step matches the provided filters.
+    """
+    steps: list[tuple[str, Optional[int]]] = []
+    if os.path.isdir(directory):
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".csv"):
+                continue
+            path: str = os.path.join(directory, file_name)
+            function_name, parameters = _step_metadata(path)
+            iteration: Optional[int] = _resampled_iteration(
+                function_name, parameters, random_state
+            )
+            if _matches_step(
+                function_name,
+                parameters,
+                iteration,
+                quantity=quantity,
+                random_state=random_state,
+                iterations=iterations,
+                iteration_mode=iteration_mode,
+            ):
+                steps.append((path, iteration))
+
+    # The random state of any step is the one of some iteration of an odd random
+    # state, so without a number of iterations the steps of the 'resample' mode
+    # are those of the first consecutive iterations stored for the random state.
+    if iterations is None:
+        stored_iterations: set[int] = {
+            iteration for _, iteration in steps if iteration is not None
+        }
+        consecutive_iterations: int = next(
+            iteration
+            for iteration in range(len(stored_iterations) + 1)
+            if iteration not in stored_iterations
+        )
+        steps = [
+            (path, iteration)
+            for path, iteration in steps
+            if iteration is None or iteration < consecutive_iterations
+        ]
+
+    # The stored steps are concatenated by header and parsed at once,
+    # as parsing each of the many small files separately dominates the report.
+    bodies: dict[str, list[str]] = {}
+    for path, _ in steps:
+        with open(path, "r", encoding="utf8") as step:
+            header, _, body = step.read().partition("\n")
+        if body:
+            bodies.setdefault(header, []).append(
+                body if body.endswith("\n") else f"{body}\n"
+            )
+
+    if not bodies:
+        raise MissingStepResults(directory)
+
+    results: pd.DataFrame = pd.concat(
+        [
+            pd.read_csv(
+                StringIO(header + "\n" + "".join(header_bodies)),
+                index_col=0,
+                float_precision="round_trip",
+            )
+            for header, header_bodies in bodies.items()
+        ],
+        ignore_index=True,
+    )
+
+    mask = pd.Series(True, index=results.index)
+    if datasets is not None:
+        mask &= results["dataset"].isin(datasets)
+    if fingerprints is not None:
+        mask &= results["fingerprint"].isin(fingerprints)
+    if similarities is not None:
+        unique_similarities = results["spectral_similarity"].unique()
+        mask &= results["spectral_similarity"].isin(
+            [
+                spectral_similarity
+                for spectral_similarity in unique_similarities
+                if _matches_similarity(spectral_similarity, similarities)
+            ]
+        )
+    results = results[mask].reset_index(drop=True)
+
+    if results.empty:
+        raise MissingStepResults(directory)
+
+    # The iterations of a similarity measure on a dataset are the number of
+    # stored estimates of each of its correlations, as counted by the experiment.
+    results["iterations"] = (
+        results.groupby(["dataset", *CORRELATION_KEYS])["correlation"]
+        .transform("size")
+        .groupby([results["dataset"], results["spectral_similarity"]])
+        .transform("max")
+    )
+
+    return results
+
+
+def plot_results(results: pd.DataFrame, directory: str = "barplots") -> None:
+    """Plot the correlations of the results, within a directory per fingerprint.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        The results of the experiment.
+    directory : str
+        The directory where the barplots are stored.
+    """
+    for fingerprint_name, fingerprint_results in results.groupby("fingerprint"):
+        fingerprint_results = fingerprint_results.copy()
+        fingerprint_results["dataset"] = fingerprint_results["dataset"].replace(
+            DATASET_ABBREVIATIONS, regex=True
+        )
+
+        barplots(
+            fingerprint_results.drop(
+                columns=["p_value", "iterations"], errors="ignore"
+            ),
+            path=os.path.join(
+                directory, fingerprint_name.replace(" ", "_").lower(), "{feature}.png"
+            ),
+            groupby=[
+                "correlation_method",
+                "dataset",
+                "spectral_similarity",
+            ],
+            unique_minor_labels=False,
+            orientation="horizontal",
+            height=6,
+            bar_width=0.1,
+            space_width=0.15,
+            subplots=True,
+        )
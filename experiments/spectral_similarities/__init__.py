@@ -6,6 +6,8 @@ from experiments.spectral_similarities.matchms_similarities import (
     NeutralLossesCosine,
     ModifiedCosine,
 )
+from experiments.spectral_similarities.cosine_family import CosineFamily
+from experiments.spectral_similarities.binned_cosine import BinnedCosine
 from experiments.spectral_similarities.ms2deepscore import MS2DeepScore
 from experiments.spectral_similarities.ms_entropy import (
     UnweightedMassSpecEntropy,
@@ -18,6 +20,8 @@ __all__ = [
     "CosineGreedy",
     "NeutralLossesCosine",
     "ModifiedCosine",
+    "CosineFamily",
+    "BinnedCosine",
     "MS2DeepScore",
     "UnweightedMassSpecEntropy",
     "WeightedMassSpecEntropy",
@@ -0,0 +1,125 @@
+"""Implementation of the Spectral Similarity interface for the binned cosine."""
+
+from typing import Optional
+from multiprocessing.pool import Pool as ProcessPool
+import numpy as np
+from scipy.sparse import csr_matrix
+from matchms import Spectrum
+from experiments.memory_mapping import allocate_similarities
+from experiments.spectral_similarities.spectral_similarity import SpectralSimilarity
+
+
+class BinnedCosine(SpectralSimilarity):
+    """Cosine similarity between spectra binned into sparse vectors.
+
+    Each spectrum is binned into a sparse vector with one bin per tolerance
+    width of m/z, and the similarities between all of the spectra are then
+    computed as a single sparse matrix product. Unlike the greedy cosine,
+    peaks falling in neighbouring bins are not matched, which makes this
+    measure a fast baseline and a cheap prefilter rather than an exact
+    replacement of the peak matching measures.
+    """
+
+    def __init__(
+        self,
+        tolerance: float,
+        verbose: bool,
+        n_jobs: int = 1,
+        intensity_power: float = 1.0,
+    ):
+        """Initialize the binned cosine similarity measure.
+
+        Parameters
+        ----------
+        tolerance : float
+            The width of the m/z bins.
+        verbose : bool
+            Whether to show the progress of the computation.
+        n_jobs : int
+            The number of processes, unused as the product is vectorized.
+        intensity_power : float
+            The power the intensities are raised to before the binning,
+            such as 0.5 to weight the peaks by the square root of their
+            intensities.
+        """
+        super().__init__(verbose, n_jobs)
+        self._tolerance: float = tolerance
+        self._intensity_power: float = intensity_power
+
+    def name(self) -> str:
+        """Return name of the binned cosine similarity measure."""
+        return "Binned Cosine"
+
+    def _vectorize(self, spectra: list[Spectrum], number_of_bins: int) -> csr_matrix:
+        """Return the L2-normalized binned vectors of the spectra as a sparse matrix."""
+        indptr: np.ndarray = np.zeros(len(spectra) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(spectrum.peaks.mz) for spectrum in spectra])
+        bins: np.ndarray = np.zeros(indptr[-1], dtype=np.int64)
+        intensities: np.ndarray = np.zeros(indptr[-1], dtype=np.float64)
+        for spectrum, start, stop in zip(spectra, indptr[:-1], indptr[1:]):
+            bins[start:stop] = np.floor(spectrum.peaks.mz / self._tolerance)
+            intensities[start:stop] = spectrum.peaks.intensities**self._intensity_power
+
+        vectors = csr_matrix(
+            (intensities, bins, indptr), shape=(len(spectra), number_of_bins)
+        )
+        # The peaks falling in the same bin are summed before the normalization.
+        vectors.sum_duplicates()
+        norms: np.ndarray = np.sqrt(vectors.multiply(vectors).sum(axis=1)).A1
+        norms[norms == 0] = 1.0
+        return csr_matrix(vectors.multiply(1.0 / norms[:, None]))
+
+    def _number_of_bins(self, spectra: list[Spectrum]) -> int:
+        """Return the number of bins needed to hold the peaks of the spectra."""
+        max_mz: float = max(
+            (spectrum.peaks.mz.max() for spectrum in spectra if len(spectrum.peaks.mz)),
+            default=0.0,
+        )
+        # The bins are computed exactly as in the vectorization, as the floor
+        # division of Python may round differently near the bin boundaries.
+        return int(np.floor(max_mz / self._tolerance)) + 1
+
+    def compute_similarity(self, spectrum1: Spectrum, spectrum2: Spectrum) -> float:
+        """Compute similarity between two spectra."""
+        vectors: csr_matrix = self._vectorize(
+            [spectrum1, spectrum2], self._number_of_bins([spectrum1, spectrum2])
+        )
+        return float(vectors[0].multiply(vectors[1]).sum())
+
+    def transform(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        tile_size: Optional[int] = None,
+        path: Optional[str] = None,
+        pool: Optional[ProcessPool] = None,  # pylint: disable=unused-argument
+    ) -> np.ndarray:
+        """Calculate the similarities between the rows and columns of the spectra.
+
+        The pool of processes is unused as the product is vectorized.
+        """
+        number_of_bins: int = self._number_of_bins(rows + columns)
+        rows_vectors: csr_matrix = self._vectorize(rows, number_of_bins)
+        columns_vectors_transposed: csr_matrix = self._vectorize(
+            columns, number_of_bins
+        ).T.tocsc()
+
+        if tile_size is None:
+            tile_size = max(len(rows), 1)
+
+        spectra_similarity: np.ndarray = allocate_similarities(
+            (len(rows), len(columns)), path
+        )
+        for start in range(0, len(rows), tile_size):
+            spectra_similarity[start : start + tile_size] = (
+                rows_vectors[start : start + tile_size] @ columns_vectors_transposed
+            ).toarray()
+        return spectra_similarity
+
+    def to_dict(self) -> dict:
+        """Return the binned cosine similarity measure as a dictionary."""
+        return {
+            "name": self.name(),
+            "tolerance": self._tolerance,
+            "intensity_power": self._intensity_power,
+        }
@@ -0,0 +1,206 @@
+"""Implementation of a combined engine for the cosine family of MatchMS similarities."""
+
+from typing import Optional, Union
+import numpy as np
+from matchms import Spectrum
+from matchms.filtering.metadata_processing.add_precursor_mz import (
+    _convert_precursor_mz,
+)
+from matchms.similarity.spectrum_similarity_functions import (
+    collect_peak_pairs,
+    score_best_matches,
+)
+from experiments.spectral_similarities.spectral_similarity import SpectralSimilarity
+from experiments.spectral_similarities.tolerances import (
+    normalize_tolerances,
+    tolerance_names,
+    tolerances_to_dict,
+)
+from experiments.exceptions import InvalidPrecursorMz
+
+
+def _precursor_mz(spectrum: Spectrum) -> float:
+    """Return the precursor m/z of the spectrum, which must be a positive number.
+
+    The precursor m/z is converted as in ModifiedCosine and NeutralLossesCosine,
+    which also accept numeric strings, and numpy scalars are accepted as well.
+    """
+    precursor_mz = spectrum.get("precursor_mz", None)
+    if isinstance(precursor_mz, np.generic):
+        precursor_mz = precursor_mz.item()
+    converted_precursor_mz = _convert_precursor_mz(precursor_mz)
+    if converted_precursor_mz is None or converted_precursor_mz <= 0:
+        raise InvalidPrecursorMz(precursor_mz)
+    return float(converted_precursor_mz)
+
+
+def _sorting_order(matching_pairs: np.ndarray) -> np.ndarray:
+    """Return the order sorting the matching pairs by decreasing intensity product.
+
+    The order is the one of MatchMS, and as the sorting is stable, it also sorts
+    any subset of the matching pairs once the pairs outside of it are removed.
+    """
+    return np.argsort(matching_pairs[:, 2], kind="mergesort")[::-1]
+
+
+def _within_tolerance(
+    matching_pairs: np.ndarray,
+    spec1: np.ndarray,
+    spec2: np.ndarray,
+    tolerance: float,
+    shift: float,
+) -> np.ndarray:
+    """Return which of the matching pairs MatchMS would match at the tolerance.
+
+    The bounds are computed exactly as in the peak matching of MatchMS, so that
+    the pairs found at a larger tolerance are filtered to the very same pairs.
+    """
+    mz1: np.ndarray = spec1[matching_pairs[:, 0].astype(np.int64), 0]
+    mz2: np.ndarray = spec2[matching_pairs[:, 1].astype(np.int64), 0] + shift
+    return (mz2 >= mz1 - tolerance) & (mz2 <= mz1 + tolerance)
+
+
+def _score(matching_pairs: np.ndarray, spec1: np.ndarray, spec2: np.ndarray) -> float:
+    """Return the greedy cosine score of the sorted matching pairs."""
+    if matching_pairs.shape[0] == 0:
+        return 0.0
+    return score_best_matches(matching_pairs, spec1, spec2, 0.0, 1.0)[0]
+
+
+class CosineFamily(SpectralSimilarity):
+    """Combined engine for the CosineGreedy, ModifiedCosine and NeutralLossesCosine measures.
+
+    The three MatchMS measures share most of their peak matching: the direct
+    matches of CosineGreedy are part of the ones of ModifiedCosine, and the
+    precursor-shifted matches of ModifiedCosine contain the ones used by
+    NeutralLossesCosine, which only ignores the peaks above the precursor.
+    This engine finds the direct and shifted matches once per pair of spectra
+    and derives the three scores from them, with the same results as the
+    separate MatchMS classes with their default parameters.
+
+    When several tolerances are provided, the peaks are matched once at the
+    largest tolerance, and the matches of every smaller tolerance are the
+    subset of those candidates within it, so that all the scores are derived
+    from a single peak matching.
+    """
+
+    def __init__(
+        self, tolerance: Union[float, list[float]], verbose: bool, n_jobs: int = 1
+    ):
+        """Initialize the cosine family similarity measures.
+
+        Parameters
+        ----------
+        tolerance : Union[float, list[float]]
+            The tolerance of the peak matching, or a list of tolerances
+            whose similarities are computed at once.
+        verbose : bool
+            Whether to show the progress of the computation.
+        n_jobs : int
+            The number of processes computing the similarities.
+        """
+        super().__init__(verbose, n_jobs)
+        self._tolerances: list[float] = normalize_tolerances(tolerance)
+
+    def name(self) -> str:
+        """Return name of the cosine family similarity measures."""
+        return "Cosine Family"
+
+    def similarity_names(self) -> list[str]:
+        """Return the names of the similarities computed by the engine."""
+        return tolerance_names(
+            ["Greedy Cosine", "Modified Cosine", "Neutral Losses Cosine"],
+            self._tolerances,
+        )
+
+    def compute_similarity(
+        self, spectrum1: Spectrum, spectrum2: Spectrum
+    ) -> np.ndarray:
+        """Compute the three cosine similarities between two spectra at each tolerance."""
+        spec1: np.ndarray = spectrum1.peaks.to_numpy
+        spec2: np.ndarray = spectrum2.peaks.to_numpy
+        precursor_mz1: float = _precursor_mz(spectrum1)
+        precursor_mz2: float = _precursor_mz(spectrum2)
+        shift: float = precursor_mz1 - precursor_mz2
+        largest_tolerance: float = max(self._tolerances)
+
+        no_pairs: np.ndarray = np.empty((0, 3))
+        direct_pairs: Optional[np.ndarray] = collect_peak_pairs(
+            spec1,
+            spec2,
+            largest_tolerance,
+            shift=0.0,
+            mz_power=0.0,
+            intensity_power=1.0,
+        )
+        shifted_pairs: Optional[np.ndarray] = collect_peak_pairs(
+            spec1,
+            spec2,
+            largest_tolerance,
+            shift=shift,
+            mz_power=0.0,
+            intensity_power=1.0,
+        )
+        if direct_pairs is None:
+            direct_pairs = no_pairs
+        if shifted_pairs is None:
+            shifted_pairs = no_pairs
+        modified_pairs: np.ndarray = np.concatenate(
+            [direct_pairs, shifted_pairs], axis=0
+        )
+
+        # The peaks at or above the precursor are ignored by the neutral losses.
+        # As the peaks are sorted by m/z, the remaining ones are a prefix of each
+        # spectrum and their matches are the shifted matches within the prefixes.
+        neutral_losses_peaks1: int = np.searchsorted(
+            spec1[:, 0], precursor_mz1, side="left"
+        )
+        neutral_losses_peaks2: int = np.searchsorted(
+            spec2[:, 0], precursor_mz2, side="left"
+        )
+        neutral_losses_mask: np.ndarray = (
+            shifted_pairs[:, 0] < neutral_losses_peaks1
+        ) & (shifted_pairs[:, 1] < neutral_losses_peaks2)
+
+        # The pairs are sorted once, and the matches of each tolerance are
+        # then selected from the sorted pairs, which keeps them sorted.
+        direct_order: np.ndarray = _sorting_order(direct_pairs)
+        modified_order: np.ndarray = _sorting_order(modified_pairs)
+        neutral_losses_pairs: np.ndarray = shifted_pairs[neutral_losses_mask]
+        neutral_losses_order: np.ndarray = _sorting_order(neutral_losses_pairs)
+
+        scores: np.ndarray = np.zeros((3, len(self._tolerances)))
+        for k, tolerance in enumerate(self._tolerances):
+            direct_mask: np.ndarray = _within_tolerance(
+                direct_pairs, spec1, spec2, tolerance, 0.0
+            )
+            shifted_mask: np.ndarray = _within_tolerance(
+                shifted_pairs, spec1, spec2, tolerance, shift
+            )
+            modified_mask: np.ndarray = np.concatenate([direct_mask, shifted_mask])
+            scores[0, k] = _score(
+                direct_pairs[direct_order[direct_mask[direct_order]]], spec1, spec2
+            )
+            scores[1, k] = _score(
+                modified_pairs[modified_order[modified_mask[modified_order]]],
+                spec1,
+                spec2,
+            )
+            scores[2, k] = _score(
+                neutral_losses_pairs[
+                    neutral_losses_order[
+                        shifted_mask[neutral_losses_mask][neutral_losses_order]
+                    ]
+                ],
+                spec1[:neutral_losses_peaks1],
+                spec2[:neutral_losses_peaks2],
+            )
+
+        return scores.ravel()
+
+    def to_dict(self) -> dict:
+        """Return the cosine family similarity measures as a dictionary."""
+        return {
+            "name": self.name(),
+            **tolerances_to_dict(self._tolerances),
+        }
@@ -0,0 +1,32 @@
+"""Submodule providing a per-process registry of the models used by spectral similarities.
+
+Models are loaded at most once per process and kept in the registry, so that
+similarity measures only need to hold the key of their model.
+"""
+
+from typing import Any, Callable
+from threading import Lock
+
+_MODELS: dict[str, Any] = {}
+_LOCK: Lock = Lock()
+
+
+def get_model(key: str, loader: Callable[[], Any]) -> Any:
+    """Return the model registered under the key, loading it if needed.
+
+    Parameters
+    ----------
+    key : str
+        The key identifying the model, such as the path of its weights.
+    loader : Callable[[], Any]
+        The function loading the model, called only when the model
+        is not yet registered in the current process.
+    """
+    model = _MODELS.get(key)
+    if model is not None:
+        return model
+
+    with _LOCK:
+        if key not in _MODELS:
+            _MODELS[key] = loader()
+        return _MODELS[key]
@@ -1,33 +1,49 @@
 """Similarity score based on ms2deepscore."""
 
+from typing import Optional
+from multiprocessing.pool import Pool as ProcessPool
 import os
 from matchms import Spectrum
 import numpy as np
 from ms2deepscore import MS2DeepScore as MS2DeepScoreModel
 from ms2deepscore.models import load_model
+from ms2deepscore.vector_operations import cosine_similarity_matrix
 from downloaders import BaseDownloader
 
+from experiments.memory_mapping import allocate_similarities
 from experiments.spectral_similarities.spectral_similarity import SpectralSimilarity
+from experiments.spectral_similarities.model_registry import get_model
 
 
 class MS2DeepScore(SpectralSimilarity):
     """Implementation of MS2DeepScore similarity measure."""
 
     def __init__(self, directory: str, verbose: bool, n_jobs: int = 1) -> None:
-        """Initialize MS2DeepScore similarity measure."""
+        """Initialize MS2DeepScore similarity measure.
+
+        The model is neither downloaded nor loaded here: the measure only
+        holds the path of the model, which is loaded once per process
+        through the model registry the first time it is needed.
+        """
         super().__init__(verbose, n_jobs)
+        self._model_path: str = os.path.join(directory, "ms2deepscore_model.pt")
 
+    def _load_model(self) -> MS2DeepScoreModel:
+        """Download and load the MS2DeepScore model."""
         downloader = BaseDownloader(
             process_number=1,
-            verbose=verbose,
+            verbose=self.verbose,
         )
         downloader.download(
             "https://zenodo.org/records/13897744/files/ms2deepscore_model.pt?download=1",
-            os.path.join(directory, "ms2deepscore_model.pt"),
-        )
-        self._model: MS2DeepScoreModel = MS2DeepScoreModel(
-            load_model(os.path.join(directory, "ms2deepscore_model.pt"))
+            self._model_path,
         )
+        return MS2DeepScoreModel(load_model(self._model_path))
+
+    @property
+    def _model(self) -> MS2DeepScoreModel:
+        """Return the MS2DeepScore model shared by the measures of this process."""
+        return get_model(self._model_path, self._load_model)
 
     def name(self) -> str:
         """Return the name of the similarity measure."""
@@ -37,9 +53,32 @@ class MS2DeepScore(SpectralSimilarity):
         """Compute similarity between two spectra."""
         return self._model.pair(spectrum1, spectrum2)
 
-    def transform(self, rows: list[Spectrum], columns: list[Spectrum]) -> np.ndarray:
-        """Calculate the similarities between the rows and columns of the spectra."""
-        return self._model.matrix(rows, columns, is_symmetric=False)
+    def transform(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        tile_size: Optional[int] = None,
+        path: Optional[str] = None,
+        pool: Optional[ProcessPool] = None,  # pylint: disable=unused-argument
+    ) -> np.ndarray:
+        """Calculate the similarities between the rows and columns of the spectra.
+
+        The pool of processes is unused as the embeddings are computed by the model.
+        """
+        rows_embeddings: np.ndarray = self._model.get_embedding_array(rows)
+        columns_embeddings: np.ndarray = self._model.get_embedding_array(columns)
+
+        if tile_size is None:
+            tile_size = max(len(rows), 1)
+
+        spectra_similarity: np.ndarray = allocate_similarities(
+            (len(rows), len(columns)), path
+        )
+        for start in range(0, len(rows), tile_size):
+            spectra_similarity[start : start + tile_size] = cosine_similarity_matrix(
+                rows_embeddings[start : start + tile_size], columns_embeddings
+            )
+        return spectra_similarity
 
     def to_dict(self) -> dict:
         """Return the ModifiedCosine similarity measure as a dictionary."""
@@ -1,92 +1,161 @@
-"""Implementation of the Spectral Similarity interface for the Mass Spec Entropy method."""
+"""Implementation of the Spectral Similarity interface for the Mass Spec Entropy method.
 
+The entropy similarities clean each spectrum before matching its peaks, merging
+the peaks closer than twice the tolerance. As the cleaning only depends on the
+spectrum and on the tolerance, we clean every spectrum of a tile once per
+tolerance instead of once per pair of spectra, and then match the cleaned
+peaks of each pair at each of the tolerances.
+"""
+
+from typing import Union
+from abc import abstractmethod
 import numpy as np
 from ms_entropy import (
     calculate_unweighted_entropy_similarity,
     calculate_entropy_similarity,
+    clean_spectrum,
 )
 from matchms import Spectrum
 
 from experiments.spectral_similarities.spectral_similarity import SpectralSimilarity
+from experiments.spectral_similarities.tolerances import (
+    normalize_tolerances,
+    tolerance_names,
+    tolerances_to_dict,
+)
 
-
-class UnweightedMassSpecEntropy(SpectralSimilarity):
-    """Implementation of the Spectral Similarity interface for the Mass Spec Entropy method."""
-
-    def __init__(self, tolerance: float, verbose: bool, n_jobs: int = 1):
-        """Initialize the ModifiedCosine similarity measure."""
+# Tolerance in Da used by the Mass Spec Entropy method when no tolerance in Da
+# is provided, which also bounds the cleaning alongside the tolerance in ppm.
+DEFAULT_TOLERANCE_IN_DA: float = 0.02
+
+
+class _MassSpecEntropy(SpectralSimilarity):
+    """Shared implementation of the weighted and unweighted Mass Spec Entropy."""
+
+    def __init__(
+        self, tolerance: Union[float, list[float]], verbose: bool, n_jobs: int = 1
+    ):
+        """Initialize the Mass Spec Entropy similarity measure.
+
+        Parameters
+        ----------
+        tolerance : Union[float, list[float]]
+            The tolerance in ppm of the peak matching, or a list of
+            tolerances whose similarities are computed at once.
+        verbose : bool
+            Whether to show the progress of the computation.
+        n_jobs : int
+            The number of processes computing the similarities.
+        """
         super().__init__(verbose, n_jobs)
-        self.tolerance = tolerance
-
-    def name(self) -> str:
-        """Return name of the ModifiedCosine similarity measure."""
-        return "Unweighted MS Entropy"
-
-    def compute_similarity(self, spectrum1: Spectrum, spectrum2: Spectrum) -> float:
+        self._tolerances: list[float] = normalize_tolerances(tolerance)
+
+    @abstractmethod
+    def _entropy_similarity(
+        self, peaks1: np.ndarray, peaks2: np.ndarray, tolerance: float
+    ) -> float:
+        """Return the entropy similarity between two cleaned spectra."""
+
+    def similarity_names(self) -> list[str]:
+        """Return the names of the similarities computed at each tolerance."""
+        return tolerance_names([self.name()], self._tolerances)
+
+    def _clean(self, spectrum: Spectrum) -> list[np.ndarray]:
+        """Return the cleaned peaks of the spectrum at each of the tolerances.
+
+        The peaks are cleaned as the Mass Spec Entropy method does when
+        asked to clean the spectra itself.
+        """
+        # We convert the spectrum to a NumPy array with
+        # the m/z and the intensities of its peaks.
+        peaks: np.ndarray = np.stack([spectrum.peaks.mz, spectrum.peaks.intensities])
+        cleaned_peaks: list[np.ndarray] = []
+        for tolerance in self._tolerances:
+            cleaned_peaks.append(
+                clean_spectrum(
+                    peaks,
+                    min_ms2_difference_in_da=2 * DEFAULT_TOLERANCE_IN_DA,
+                    min_ms2_difference_in_ppm=2 * tolerance,
+                )
+            )
+        return cleaned_peaks
+
+    def _similarities(
+        self, cleaned_peaks1: list[np.ndarray], cleaned_peaks2: list[np.ndarray]
+    ) -> Union[float, np.ndarray]:
+        """Return the similarities between two cleaned spectra at each tolerance."""
+        similarities: list[float] = [
+            self._entropy_similarity(peaks1, peaks2, tolerance)
+            for tolerance, peaks1, peaks2 in zip(
+                self._tolerances, cleaned_peaks1, cleaned_peaks2
+            )
+        ]
+        if len(similarities) == 1:
+            return similarities[0]
+        return np.array(similarities)
+
+    def compute_similarity(
+        self, spectrum1: Spectrum, spectrum2: Spectrum
+    ) -> Union[float, np.ndarray]:
         """Compute similarity between two spectra."""
-
-        # We convert the spectra to two NumPy arrays with shape
-        # (n, 2), where n is the number of peaks in the spectrum,
-        # and the second dimension contains the m/z and intensity.
-        spectrum1_array: np.ndarray = np.stack(
-            [spectrum1.peaks.mz, spectrum1.peaks.intensities]
-        )
-
-        spectrum2_array: np.ndarray = np.stack(
-            [spectrum2.peaks.mz, spectrum2.peaks.intensities]
-        )
-
-        return calculate_unweighted_entropy_similarity(
-            spectrum1_array,
-            spectrum2_array,
-            ms2_tolerance_in_ppm=self.tolerance,
-            clean_spectra=True,
-        )
+        return self._similarities(self._clean(spectrum1), self._clean(spectrum2))
+
+    def _fill_similarities(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        spectra_similarity: np.ndarray,
+    ) -> None:
+        """Fill the provided matrix with the similarities between rows and columns."""
+        columns_peaks: list[list[np.ndarray]] = [
+            self._clean(column_spectrum) for column_spectrum in columns
+        ]
+        for i, row_spectrum in enumerate(rows):
+            row_peaks: list[np.ndarray] = self._clean(row_spectrum)
+            for j, column_peaks in enumerate(columns_peaks):
+                spectra_similarity[..., i, j] = self._similarities(
+                    row_peaks, column_peaks
+                )
 
     def to_dict(self) -> dict:
-        """Return the ModifiedCosine similarity measure as a dictionary."""
+        """Return the Mass Spec Entropy similarity measure as a dictionary."""
         return {
             "name": self.name(),
-            "tolerance": self.tolerance,
+            **tolerances_to_dict(self._tolerances),
         }
 
 
-class WeightedMassSpecEntropy(SpectralSimilarity):
+class UnweightedMassSpecEntropy(_MassSpecEntropy):
     """Implementation of the Spectral Similarity interface for the Mass Spec Entropy method."""
 
-    def __init__(self, tolerance: float, verbose: bool, n_jobs: int = 1):
-        """Initialize the ModifiedCosine similarity measure."""
-        super().__init__(verbose, n_jobs)
-        self.tolerance = tolerance
-
     def name(self) -> str:
-        """Return name of the ModifiedCosine similarity measure."""
-        return "Weighted MS Entropy"
-
-    def compute_similarity(self, spectrum1: Spectrum, spectrum2: Spectrum) -> float:
-        """Compute similarity between two spectra."""
+        """Return name of the Unweighted Mass Spec Entropy similarity measure."""
+        return "Unweighted MS Entropy"
 
-        # We convert the spectra to two NumPy arrays with shape
-        # (n, 2), where n is the number of peaks in the spectrum,
-        # and the second dimension contains the m/z and intensity.
-        spectrum1_array: np.ndarray = np.stack(
-            [spectrum1.peaks.mz, spectrum1.peaks.intensities]
+    def _entropy_similarity(
+        self, peaks1: np.ndarray, peaks2: np.ndarray, tolerance: float
+    ) -> float:
+        """Return the unweighted entropy similarity between two cleaned spectra."""
+        return calculate_unweighted_entropy_similarity(
+            peaks1, peaks2, ms2_tolerance_in_ppm=tolerance, clean_spectra=False
         )
 
-        spectrum2_array: np.ndarray = np.stack(
-            [spectrum2.peaks.mz, spectrum2.peaks.intensities]
-        )
 
+class WeightedMassSpecEntropy(_MassSpecEntropy):
+    """Implementation of the Spectral Similarity interface for the Mass Spec Entropy method."""
+
+    def name(self) -> str:
+        """Return name of the Weighted Mass Spec Entropy similarity measure."""
+        return "Weighted MS Entropy"
+
+    def _entropy_similarity(
+        self, peaks1: np.ndarray, peaks2: np.ndarray, tolerance: float
+    ) -> float:
+        """Return the weighted entropy similarity between two cleaned spectra.
+
+        The entropy based intensity weights are applied to the cleaned peaks
+        by the Mass Spec Entropy method itself.
+        """
         return calculate_entropy_similarity(
-            spectrum1_array,
-            spectrum2_array,
-            ms2_tolerance_in_ppm=self.tolerance,
-            clean_spectra=True,
+            peaks1, peaks2, ms2_tolerance_in_ppm=tolerance, clean_spectra=False
         )
-
-    def to_dict(self) -> dict:
-        """Return the ModifiedCosine similarity measure as a dictionary."""
-        return {
-            "name": self.name(),
-            "tolerance": self.tolerance,
-        }
@@ -1,11 +1,15 @@
 """Submodule providing an interface defining spectral similarities."""
 
+from typing import Optional
 from abc import abstractmethod
+from contextlib import nullcontext
 from multiprocessing import Pool
+from multiprocessing.pool import Pool as ProcessPool
 from matchms import Spectrum
 from tqdm.auto import tqdm
 import numpy as np
 from dict_hash import Hashable, sha256
+from experiments.memory_mapping import allocate_similarities
 
 
 class SpectralSimilarity(Hashable):
@@ -30,52 +34,129 @@ class SpectralSimilarity(Hashable):
         """Return number of jobs."""
         return self._n_jobs
 
+    def similarity_names(self) -> list[str]:
+        """Return the names of the similarities computed by the measure.
+
+        Measures computing several similarities at once return from
+        compute_similarity an array with one score per name, and from
+        transform a stack of matrices with one matrix per name.
+        """
+        return [self.name()]
+
+    def _shape(self, rows: list[Spectrum], columns: list[Spectrum]) -> tuple[int, ...]:
+        """Return the shape of the similarities between the rows and columns."""
+        number_of_similarities: int = len(self.similarity_names())
+        if number_of_similarities == 1:
+            return (len(rows), len(columns))
+        return (number_of_similarities, len(rows), len(columns))
+
     @abstractmethod
     def compute_similarity(self, spectrum1: Spectrum, spectrum2: Spectrum) -> float:
         """Compute similarity between two spectra."""
 
+    def _fill_similarities(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        spectra_similarity: np.ndarray,
+    ) -> None:
+        """Fill the provided matrix with the similarities between rows and columns."""
+        for i, row_spectrum in enumerate(rows):
+            for j, column_spectrum in enumerate(columns):
+                spectra_similarity[..., i, j] = self.compute_similarity(row_spectrum, column_spectrum)
+
     def _compute_similarities(self, args) -> np.ndarray:
         """Compute similarity between two spectra."""
         rows, columns = args
-        spectra_similarity = np.zeros((len(rows), len(columns)), dtype=np.float32)
-        for i, row_spectrum in enumerate(rows):
-            for j, column_spectrum in enumerate(columns):
-                spectra_similarity[i, j] = self.compute_similarity(row_spectrum, column_spectrum)
+        spectra_similarity = np.zeros(self._shape(rows, columns), dtype=np.float32)
+        self._fill_similarities(rows, columns, spectra_similarity)
         return spectra_similarity
 
-    def transform(self, rows: list[Spectrum], columns: list[Spectrum]) -> np.ndarray:
-        """Calculate the similarities between the rows and columns of the spectra."""
-        spectra_similarity: np.ndarray = np.zeros(
-            (
-                len(rows),
-                len(columns),
-            ),
-            dtype=np.float32,
+    def _store_similarities(self, args) -> None:
+        """Compute similarity between two spectra directly into the memory-mapped file."""
+        rows, columns, path, start = args
+        spectra_similarity: np.memmap = np.load(path, mmap_mode="r+")
+        self._fill_similarities(
+            rows, columns, spectra_similarity[..., start : start + len(rows), :]
         )
+        spectra_similarity.flush()
 
-        with Pool(self.n_jobs) as pool:
-            chunk_size = len(rows) // self.n_jobs
-            tasks = (
-                (
-                    rows[chunk_number * chunk_size : (chunk_number + 1) * chunk_size],
-                    columns,
+    def transform(
+        self,
+        rows: list[Spectrum],
+        columns: list[Spectrum],
+        tile_size: Optional[int] = None,
+        path: Optional[str] = None,
+        pool: Optional[ProcessPool] = None,
+    ) -> np.ndarray:
+        """Calculate the similarities between the rows and columns of the spectra.
+
+        Parameters
+        ----------
+        rows : list[Spectrum]
+            The spectra to use as rows of the similarity matrix.
+        columns : list[Spectrum]
+            The spectra to use as columns of the similarity matrix.
+        tile_size : Optional[int]
+            The number of rows computed by each task. By default, the rows
+            are split evenly between the jobs.
+        path : Optional[str]
+            The path of the '.npy' file backing the similarity matrix.
+            When provided, the workers write their tiles directly into
+            the memory-mapped file.
+        pool : Optional[ProcessPool]
+            The pool of processes computing the tiles, such as the one shared
+            by the stages of the pipelined experiment. By default, a pool of
+            processes is started for the transform.
+        """
+        spectra_similarity: np.ndarray = allocate_similarities(
+            self._shape(rows, columns), path
+        )
+
+        if tile_size is None:
+            tile_size = max(-(-len(rows) // self.n_jobs), 1)
+
+        number_of_tiles: int = -(-len(rows) // tile_size)
+
+        processes = Pool(self.n_jobs) if pool is None else nullcontext(pool)
+        with processes as pool:
+            if path is None:
+                tasks = (
+                    (
+                        rows[tile_number * tile_size : (tile_number + 1) * tile_size],
+                        columns,
+                    )
+                    for tile_number in range(number_of_tiles)
+                )
+                similarities_chunks = pool.imap(self._compute_similarities, tasks)
+            else:
+                spectra_similarity.flush()
+                tasks = (
+                    (
+                        rows[tile_number * tile_size : (tile_number + 1) * tile_size],
+                        columns,
+                        path,
+                        tile_number * tile_size,
+                    )
+                    for tile_number in range(number_of_tiles)
                 )
-                for chunk_number in range(self.n_jobs)
-            )
+                similarities_chunks = pool.imap(self._store_similarities, tasks)
+
             for i, similarities_chunk in enumerate(
                 tqdm(
-                    pool.imap(self._compute_similarities, tasks),
+                    similarities_chunks,
                     desc=self.name(),
                     leave=False,
                     dynamic_ncols=True,
                     disable=not self.verbose,
                     unit="spectral chunk",
-                    total=self.n_jobs,
+                    total=number_of_tiles,
                 )
             ):
-                spectra_similarity[i * chunk_size : (i + 1) * chunk_size] = (
-                    similarities_chunk
-                )
+                if path is None:
+                    spectra_similarity[..., i * tile_size : (i + 1) * tile_size, :] = (
+                        similarities_chunk
+                    )
         return spectra_similarity
 
     @abstractmethod
@@ -0,0 +1,45 @@
+"""Submodule providing the handling of the tolerances of the peak matching measures.
+
+The peak matching measures accept either a single tolerance or a list of
+tolerances. With several tolerances, they compute one similarity per
+tolerance, stacked as separate layers named after their tolerance.
+"""
+
+from typing import Union
+from experiments.exceptions import InvalidTolerances
+
+
+def normalize_tolerances(tolerance: Union[float, list[float]]) -> list[float]:
+    """Return the provided tolerance or tolerances as a list of floats."""
+    tolerances = [tolerance] if isinstance(tolerance, (int, float)) else list(tolerance)
+    if (
+        len(tolerances) == 0
+        or len(set(tolerances)) != len(tolerances)
+        or any(
+            not isinstance(value, (int, float)) or value <= 0 for value in tolerances
+        )
+    ):
+        raise InvalidTolerances(tolerance)
+    return [float(value) for value in tolerances]
+
+
+def tolerance_names(names: list[str], tolerances: list[float]) -> list[str]:
+    """Return the names of the similarities computed at each of the tolerances.
+
+    The similarities are ordered by name and then by tolerance, and a single
+    tolerance keeps the names unchanged.
+    """
+    if len(tolerances) == 1:
+        return list(names)
+    return [
+        f"{name} (tolerance {tolerance:g})"
+        for name in names
+        for tolerance in tolerances
+    ]
+
+
+def tolerances_to_dict(tolerances: list[float]) -> dict:
+    """Return the tolerances as a dictionary, as a single tolerance when only one."""
+    if len(tolerances) == 1:
+        return {"tolerance": tolerances[0]}
+    return {"tolerances": tolerances}
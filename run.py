@@ -1,13 +1,24 @@
-"""Executor for the experiment."""
+"""Executor for the experiment.
 
+Running 'python run.py report' instead aggregates the stored results of the
+steps of the experiment, and plots them, without running the experiment.
+"""
+
+from typing import Optional
 from argparse import ArgumentParser
 from multiprocessing import cpu_count
+import logging
+import sys
 import pandas as pd
-from experiments import experiment
+from experiments.memory_budget import parse_memory_size
+from experiments.convergence import ConvergenceCriterion
 
 
-def main():
+def run_experiment(arguments: list[str]):
     """Run the experiment."""
+    # The experiment is imported here, as it loads all of the scoring libraries.
+    from experiments import experiment  # pylint: disable=import-outside-toplevel
+
     parser = ArgumentParser(description="Run the experiment.")
     parser.add_argument(
         "--quantity",
@@ -25,7 +36,10 @@ def main():
         "--iterations",
         type=int,
         required=True,
-        help="The number of iterations to run.",
+        help=(
+            "The number of iterations to run, or their maximal number "
+            "when a target confidence interval width is provided."
+        ),
     )
     parser.add_argument(
         "--output",
@@ -50,7 +64,102 @@ def main():
         default=cpu_count(),
         help="The number of jobs to use.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--max-memory",
+        type=parse_memory_size,
+        default=None,
+        help=(
+            "The memory budget of each step, such as '16GB' or '512MiB'. "
+            "It is used to choose the tile sizes of the similarities and "
+            "correlations. By default, the whole matrices are computed at once."
+        ),
+    )
+    parser.add_argument(
+        "--sample-rank-pairs",
+        action="store_true",
+        help=(
+            "Whether Spearman and Kendall may be estimated on a random subset "
+            "of the pairs when the ranks of all of the pairs do not fit in the "
+            "memory budget. By default, such a budget is reported as insufficient."
+        ),
+    )
+    parser.add_argument(
+        "--iteration-mode",
+        type=str,
+        choices=["resample", "subsample", "bootstrap"],
+        default="resample",
+        help=(
+            "How the iterations are sampled. 'resample' samples new spectra at "
+            "each iteration, while 'subsample' and 'bootstrap' compute the "
+            "similarities once over a pool of spectra, and at each iteration "
+            "respectively subsample its spectra without replacement or bootstrap "
+            "its pairs with replacement."
+        ),
+    )
+    parser.add_argument(
+        "--pool-quantity",
+        type=int,
+        default=None,
+        help=(
+            "The number of spectra in the pool of the 'subsample' and 'bootstrap' "
+            "iteration modes. By default, twice the quantity when subsampling "
+            "and the quantity itself when bootstrapping."
+        ),
+    )
+    parser.add_argument(
+        "--scratch-directory",
+        type=str,
+        default=None,
+        help=(
+            "The directory, ideally on fast local storage, where the similarity "
+            "matrices are stored as memory-mapped files. By default, they are "
+            "kept in memory."
+        ),
+    )
+    parser.add_argument(
+        "--target-ci-width",
+        type=float,
+        default=None,
+        help=(
+            "The width of the 95%% confidence interval of the mean correlations "
+            "below which the iterations of a similarity measure on a dataset "
+            "stop. By default, all the iterations are executed."
+        ),
+    )
+    parser.add_argument(
+        "--min-iterations",
+        type=int,
+        default=3,
+        help=(
+            "The number of iterations executed before checking the confidence "
+            "intervals, when a target confidence interval width is provided."
+        ),
+    )
+    parser.add_argument(
+        "--tolerance-factors",
+        type=float,
+        nargs="+",
+        default=None,
+        help=(
+            "The factors the tolerance of each dataset is multiplied by, such as "
+            "'0.5 1 2', to compute the peak matching similarities at several "
+            "tolerances in a single pass. By default, only the tolerance of "
+            "each dataset is used."
+        ),
+    )
+    parser.add_argument(
+        "--no-pipeline",
+        action="store_true",
+        help=(
+            "Whether to run the stages of the experiment one after the other, "
+            "instead of loading the next dataset, fingerprinting the next sample "
+            "and correlating the previous step while the spectral similarities "
+            "of the current step are computed."
+        ),
+    )
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
 
     results: pd.DataFrame = experiment(
         iterations=args.iterations,
@@ -60,10 +169,152 @@ def main():
         verbose=args.verbose,
         n_jobs=args.n_jobs,
         cache=True,
+        max_memory=args.max_memory,
+        iteration_mode=args.iteration_mode,
+        pool_quantity=args.pool_quantity,
+        scratch_directory=args.scratch_directory,
+        convergence=(
+            None
+            if args.target_ci_width is None
+            else ConvergenceCriterion(
+                target_width=args.target_ci_width,
+                min_iterations=args.min_iterations,
+            )
+        ),
+        tolerance_factors=args.tolerance_factors,
+        pipelined=not args.no_pipeline,
+        sample_rank_pairs=args.sample_rank_pairs,
+    )
+
+    results.to_csv(args.output, index=False)
+
+
+def run_report(arguments: list[str]):
+    """Aggregate and plot the stored results of the experiment."""
+    # pylint: disable=import-outside-toplevel
+    from experiments.report import load_results, plot_results
+
+    parser = ArgumentParser(
+        prog="run.py report",
+        description=(
+            "Aggregate and plot the stored results of the steps of the "
+            "experiment, without running the experiment."
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="The output file to save the results to.",
+    )
+    parser.add_argument(
+        "--results-directory",
+        type=str,
+        default="results",
+        help="The directory where the steps of the experiment stored their results.",
+    )
+    parser.add_argument(
+        "--barplots-directory",
+        type=str,
+        default="barplots",
+        help="The directory to store the barplots in.",
+    )
+    parser.add_argument(
+        "--quantity",
+        type=int,
+        default=None,
+        help=(
+            "The number of spectra sampled by the steps to report. "
+            "By default, the steps of all quantities are reported."
+        ),
+    )
+    parser.add_argument(
+        "--random-state",
+        type=int,
+        default=None,
+        help=(
+            "The random state of the experiment to report. "
+            "By default, the steps of all random states are reported."
+        ),
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=None,
+        help=(
+            "The number of iterations of the experiment to report, which in "
+            "the 'resample' mode requires the random state. By default, the "
+            "steps of all iterations are reported."
+        ),
+    )
+    parser.add_argument(
+        "--iteration-mode",
+        type=str,
+        choices=["resample", "subsample", "bootstrap"],
+        default=None,
+        help=(
+            "The iteration mode of the experiment to report. "
+            "By default, the steps of all iteration modes are reported."
+        ),
+    )
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="+",
+        default=None,
+        help="The names of the datasets to report. By default, all of them.",
+    )
+    parser.add_argument(
+        "--similarities",
+        type=str,
+        nargs="+",
+        default=None,
+        help=(
+            "The names of the spectral similarities to report, such as "
+            "'Greedy Cosine', which also match their variants computed at "
+            "several tolerances. By default, all of them."
+        ),
+    )
+    parser.add_argument(
+        "--fingerprints",
+        type=str,
+        nargs="+",
+        default=None,
+        help="The names of the fingerprints to report. By default, all of them.",
+    )
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        help="Whether to only write the results, without plotting them.",
+    )
+    args = parser.parse_args(arguments)
+
+    results: pd.DataFrame = load_results(
+        directory=args.results_directory,
+        quantity=args.quantity,
+        datasets=args.datasets,
+        similarities=args.similarities,
+        fingerprints=args.fingerprints,
+        random_state=args.random_state,
+        iterations=args.iterations,
+        iteration_mode=args.iteration_mode,
     )
 
     results.to_csv(args.output, index=False)
 
+    if not args.no_plots:
+        plot_results(results, directory=args.barplots_directory)
+
+
+def main(arguments: Optional[list[str]] = None):
+    """Run the experiment, or report its stored results."""
+    if arguments is None:
+        arguments = sys.argv[1:]
+    if arguments[:1] == ["report"]:
+        run_report(arguments[1:])
+    else:
+        run_experiment(arguments)
+
 
 if __name__ == "__main__":
     main()
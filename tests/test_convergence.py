@@ -0,0 +1,75 @@
+"""Test the convergence criterion of the adaptive iterations."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import t
+from experiments.convergence import ConvergenceCriterion, count_iterations
+from experiments.exceptions import InvalidConvergenceCriterion
+
+
+def _results(correlations: dict[str, list[float]]) -> pd.DataFrame:
+    """Return the results of a cell with the provided correlations by method."""
+    return pd.DataFrame(
+        [
+            {
+                "dataset": "Dataset",
+                "fingerprint": "Fingerprint",
+                "spectral_similarity": "Similarity",
+                "correlation_method": correlation_method,
+                "correlation": correlation,
+                "p_value": 0.0,
+            }
+            for correlation_method, method_correlations in correlations.items()
+            for correlation in method_correlations
+        ]
+    )
+
+
+def test_convergence_criterion_validation():
+    """Test that invalid convergence criteria are rejected."""
+    for parameters in (
+        {"target_width": 0.0},
+        {"target_width": -0.1},
+        {"target_width": 0.1, "min_iterations": 1},
+        {"target_width": 0.1, "confidence_level": 0.0},
+        {"target_width": 0.1, "confidence_level": 1.0},
+    ):
+        with pytest.raises(InvalidConvergenceCriterion):
+            ConvergenceCriterion(**parameters)
+
+
+def test_count_iterations():
+    """Test that the iterations are the most estimates of any correlation."""
+    assert count_iterations(pd.DataFrame()) == 0
+    assert (
+        count_iterations(
+            _results({"Pearson": [0.1, 0.2, 0.3], "Spearman": [0.1, np.nan]})
+        )
+        == 3
+    )
+
+
+def test_width():
+    """Test that the width is the widest confidence interval of the correlations."""
+    criterion = ConvergenceCriterion(0.1, confidence_level=0.9)
+    pearson = [0.1, 0.3, 0.2, 0.25]
+    spearman = [0.5, 0.5, np.nan]
+    results = _results({"Pearson": pearson, "Spearman": spearman, "Kendall": [0.4]})
+
+    # The constant Spearman and the single Kendall estimate have no width.
+    assert np.isclose(
+        criterion.width(results),
+        2 * t.ppf(0.95, 3) * np.std(pearson, ddof=1) / np.sqrt(4),
+    )
+    assert criterion.width(_results({"Kendall": [0.4, np.nan]})) == 0.0
+
+
+def test_converged():
+    """Test that the iterations converge once narrow enough after the minimum."""
+    results = _results({"Pearson": [0.2, 0.21, 0.2, 0.19]})
+    width = ConvergenceCriterion(1.0).width(results)
+
+    assert ConvergenceCriterion(width * 1.01, min_iterations=4).converged(results)
+    assert not ConvergenceCriterion(width * 0.99, min_iterations=4).converged(results)
+    assert not ConvergenceCriterion(width * 1.01, min_iterations=5).converged(results)
@@ -0,0 +1,137 @@
+"""Test the tiled correlation stage against scipy."""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import pearsonr, spearmanr, kendalltau
+from experiments.correlations import (
+    RankCache,
+    RankedSimilarities,
+    bootstrap_pairs,
+    sample_pairs,
+)
+from experiments.experiment import _correlate_step
+from experiments.memory_budget import MemoryPlan
+from experiments.molecular_similarities import jaccard
+from experiments.pipeline import StepSample
+
+
+class _Stub:
+    """Dataset and similarity measure providing only their names."""
+
+    def __init__(self, *names: str):
+        self._names: tuple[str, ...] = names
+
+    def name(self) -> str:
+        """Return the name of the stub."""
+        return self._names[0]
+
+    def similarity_names(self) -> list[str]:
+        """Return the names of the similarities of the stub."""
+        return list(self._names)
+
+
+def test_correlate_step():
+    """Test that the tiled correlations of a step match scipy over the whole matrices."""
+    rng = np.random.default_rng(42)
+    shape = (17, 13)
+    structures_indices = rng.integers(9, size=sum(shape))
+    structures_fingerprints = {
+        name: rng.integers(256, size=(9, 4), dtype=np.uint8)
+        for name in ("First", "Second")
+    }
+    spectral_similarities = rng.random((2, *shape), dtype=np.float32).round(2)
+    sample = StepSample(
+        rows=[None] * shape[0],
+        columns=[None] * shape[1],
+        structures_indices=structures_indices,
+        structures_fingerprints=structures_fingerprints,
+    )
+
+    for rank_correlation_pairs in (shape[0] * shape[1], 150):
+        memory_plan = MemoryPlan(
+            spectral_tile_size=5,
+            jaccard_tile_size=5,
+            structures_tile_size=4,
+            rank_correlation_pairs=rank_correlation_pairs,
+            number_of_pairs=shape[0] * shape[1],
+            resident_bytes=0,
+            max_memory=None,
+        )
+        results = pd.DataFrame(
+            _correlate_step(
+                dataset=_Stub("Dataset"),
+                similarity_measure=_Stub("Layer 0", "Layer 1"),
+                memory_plan=memory_plan,
+                quantity=shape[0],
+                random_state=7,
+                verbose=False,
+                scratch=None,
+                rank_cache=RankCache(4),
+                sample=sample,
+                spectral_similarities=spectral_similarities,
+            )
+        ).set_index(["fingerprint", "spectral_similarity", "correlation_method"])
+
+        pairs = sample_pairs(shape[0] * shape[1], rank_correlation_pairs, 7)
+        assert (pairs is None) == (rank_correlation_pairs == shape[0] * shape[1])
+        for fingerprint_name, fingerprints in structures_fingerprints.items():
+            fingerprint_similarities = jaccard(fingerprints, fingerprints)[
+                np.ix_(structures_indices[: shape[0]], structures_indices[shape[0] :])
+            ].ravel()
+            for layer, layer_similarities in enumerate(spectral_similarities):
+                spectral_similarities_layer = layer_similarities.ravel()
+                for method_name, method, selected in (
+                    ("Pearson", pearsonr, slice(None)),
+                    ("Spearman", spearmanr, slice(None) if pairs is None else pairs),
+                    ("Kendall", kendalltau, slice(None) if pairs is None else pairs),
+                ):
+                    assert np.allclose(
+                        results.loc[
+                            (fingerprint_name, f"Layer {layer}", method_name),
+                            ["correlation", "p_value"],
+                        ].to_numpy(dtype=np.float64),
+                        method(
+                            fingerprint_similarities[selected].astype(np.float64),
+                            spectral_similarities_layer[selected].astype(np.float64),
+                        ),
+                    ), (fingerprint_name, layer, method_name)
+
+
+def test_ranked_similarities():
+    """Test that the rank correlations from cached ranks match scipy."""
+    rng = np.random.default_rng(42)
+    spectral_similarities = rng.random(500, dtype=np.float32).round(2)
+    fingerprint_similarities = [
+        (spectral_similarities + rng.random(500, dtype=np.float32)).round(decimals)
+        for decimals in (1, 3)
+    ]
+
+    spectral_ranks = RankedSimilarities(spectral_similarities)
+    for similarities in fingerprint_similarities:
+        fingerprint_ranks = RankedSimilarities(similarities)
+        for ranked_method, method in (
+            (fingerprint_ranks.spearman, spearmanr),
+            (fingerprint_ranks.kendall, kendalltau),
+        ):
+            assert np.allclose(
+                ranked_method(spectral_ranks),
+                method(similarities, spectral_similarities),
+            )
+
+
+def test_bootstrap_pairs():
+    """Test that the bootstrapped pairs do not depend on the tiles and cover the pool."""
+    rows, columns = bootstrap_pairs(50, 40, range(40), (7, 3))
+    assert rows.shape == columns.shape == (40, 40)
+    tiled = [
+        bootstrap_pairs(50, 40, range(start, min(start + 7, 40)), (7, 3))
+        for start in range(0, 40, 7)
+    ]
+    assert np.array_equal(rows, np.concatenate([tile_rows for tile_rows, _ in tiled]))
+    assert np.array_equal(
+        columns, np.concatenate([tile_columns for _, tile_columns in tiled])
+    )
+
+    # The self-pairs are about as frequent as among the pairs of the pool.
+    rows, columns = bootstrap_pairs(50, 400, range(400), (7, 3))
+    assert abs(np.mean(rows == columns) - 1 / 50) < 0.005
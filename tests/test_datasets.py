@@ -0,0 +1,84 @@
+"""Test the compact on-disk form of the spectra of the datasets."""
+
+import os
+import numpy as np
+from matchms import Spectrum
+from experiments.datasets import Dataset
+
+
+class _SourceDataset(Dataset):
+    """Dataset loading random spectra, whose source is a file of the directory."""
+
+    def __init__(self, directory: str):
+        super().__init__(directory, verbose=False)
+        self.loads: int = 0
+
+    def name(self) -> str:
+        """Return the name of the dataset."""
+        return "Source"
+
+    def _sources(self) -> list[str]:
+        """Return the path of the source file."""
+        return [os.path.join(self.directory, "source.txt")]
+
+    def _load_spectra(self) -> list[Spectrum]:
+        """Return random spectra with metadata of several types."""
+        self.loads += 1
+        rng = np.random.default_rng(42)
+        with open(self._sources()[0], "w", encoding="utf8") as source:
+            source.write("spectra")
+        return [
+            Spectrum(
+                mz=np.sort(rng.uniform(50, 500, number_of_peaks)),
+                intensities=rng.uniform(0.01, 1.0, number_of_peaks),
+                metadata={
+                    "precursor_mz": float(rng.uniform(100, 600)),
+                    "charge": int(rng.integers(-2, 3)),
+                    "smiles": "CCO",
+                    "ionmode": "positive",
+                },
+                metadata_harmonization=False,
+            )
+            for number_of_peaks in rng.integers(0, 20, size=30)
+        ]
+
+    def tolerance(self) -> float:
+        """Return the tolerance of the dataset."""
+        return 0.1
+
+    def to_dict(self) -> dict:
+        """Return the dataset as a dictionary."""
+        return {"name": self.name()}
+
+
+def test_stored_spectra_round_trip(tmp_path):
+    """Test that the released spectra are reloaded identical from their stored form."""
+    dataset = _SourceDataset(str(tmp_path))
+    assert dataset.spectra_size() is None
+    sample = dataset.sample_spectra(10, random_state=7)
+    size = dataset.spectra_size()
+
+    dataset.release()
+    assert dataset.spectra_size()[0] == size[0]
+    reloaded_sample = dataset.sample_spectra(10, random_state=7)
+    assert dataset.loads == 1
+    assert reloaded_sample == sample
+    for spectrum, reloaded_spectrum in zip(sample, reloaded_sample):
+        assert reloaded_spectrum.metadata == spectrum.metadata
+        assert np.array_equal(reloaded_spectrum.peaks.mz, spectrum.peaks.mz)
+        assert np.array_equal(
+            reloaded_spectrum.peaks.intensities, spectrum.peaks.intensities
+        )
+
+
+def test_stale_stored_spectra(tmp_path):
+    """Test that the stored spectra are not reused once their source changes."""
+    dataset = _SourceDataset(str(tmp_path))
+    dataset.spectra()
+    dataset.release()
+
+    with open(os.path.join(tmp_path, "source.txt"), "w", encoding="utf8") as source:
+        source.write("updated spectra")
+    assert dataset.spectra_size() is None
+    dataset.spectra()
+    assert dataset.loads == 2
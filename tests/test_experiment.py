@@ -0,0 +1,112 @@
+"""Test the experiment on small synthetic datasets."""
+
+from importlib import import_module
+import numpy as np
+import pandas as pd
+from matchms import Spectrum
+from experiments.datasets import Dataset
+from experiments.spectral_similarities import BinnedCosine
+from experiments.experiment import experiment
+
+# The package binds the experiment over its submodule, so the submodule
+# patched by the tests is looked up among the imported modules.
+EXPERIMENT_MODULE = import_module("experiments.experiment")
+
+SMILES: list[str] = [
+    "CCO",
+    "c1ccccc1",
+    "CC(=O)O",
+    "CCN",
+    "CCCC",
+    "c1ccncc1",
+    "OCC(O)CO",
+    "CC(C)O",
+]
+
+
+class RandomDataset(Dataset):
+    """Dataset of random spectra of a few structures."""
+
+    def __init__(self, directory: str, random_state: int):
+        super().__init__(directory, verbose=False)
+        self._random_state: int = random_state
+
+    def name(self) -> str:
+        """Return the name of the dataset."""
+        return f"Random {self._random_state}"
+
+    def _load_spectra(self) -> list[Spectrum]:
+        """Return the random spectra of the dataset."""
+        rng = np.random.default_rng(self._random_state)
+        spectra: list[Spectrum] = []
+        for number in range(40):
+            mz = np.unique(rng.uniform(50, 500, rng.integers(3, 20)).round(2))
+            spectra.append(
+                Spectrum(
+                    mz=mz,
+                    intensities=rng.uniform(0.01, 1.0, mz.size),
+                    metadata={
+                        "precursor_mz": float(rng.uniform(300, 600)),
+                        "smiles": SMILES[number % len(SMILES)],
+                    },
+                    metadata_harmonization=False,
+                )
+            )
+        return spectra
+
+    def tolerance(self) -> float:
+        """Return the tolerance of the dataset."""
+        return 0.1
+
+    def to_dict(self) -> dict:
+        """Return the dataset as a dictionary."""
+        return {"name": self.name(), "random_state": self._random_state}
+
+
+class BinnedScore(BinnedCosine):
+    """Stand-in for MS2DeepScore, whose model is not available offline."""
+
+    def __init__(self, directory: str, verbose: bool, n_jobs: int = 1):
+        super().__init__(0.5, verbose, n_jobs)
+
+    def name(self) -> str:
+        """Return the name of the stand-in."""
+        return "Binned Score"
+
+
+def run_experiment(
+    directory: str, iterations: int = 2, random_state: int = 42, **kwargs
+) -> pd.DataFrame:
+    """Run a small experiment on two random datasets."""
+    return experiment(
+        iterations=iterations,
+        quantity=6,
+        random_state=random_state,
+        directory=directory,
+        n_jobs=2,
+        verbose=False,
+        datasets=[RandomDataset(directory, random_state) for random_state in (1, 2)],
+        **kwargs,
+    )
+
+
+def test_pipelined_experiment(tmp_path, monkeypatch):
+    """Test that the pipelined experiment has the results of the sequential one."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(EXPERIMENT_MODULE, "MS2DeepScore", BinnedScore)
+    monkeypatch.setattr(EXPERIMENT_MODULE, "plot_results", lambda results: None)
+
+    # Halving the budget of the pipelined steps would not fit their ranks.
+    for max_memory in (None, 600_000):
+        pipelined, sequential = (
+            run_experiment(
+                "data",
+                cache=False,
+                max_memory=max_memory,
+                sample_rank_pairs=True,
+                pipelined=pipelined,
+            )
+            for pipelined in (True, False)
+        )
+        assert len(pipelined) == 2 * 2 * 4 * 7 * 3
+        pd.testing.assert_frame_equal(pipelined, sequential)
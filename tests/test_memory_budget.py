@@ -0,0 +1,113 @@
+"""Test the tiling chosen by the memory budget."""
+
+import pytest
+from experiments.memory_budget import MemoryBudget, MemoryPlan, parse_memory_size
+from experiments.exceptions import InsufficientMemoryBudget, InvalidMemorySize
+
+# A step of 100 rows and columns, with four fingerprints of 2048 bits each.
+STEP: dict = {
+    "number_of_rows": 100,
+    "number_of_columns": 100,
+    "fingerprint_bytes": 1024,
+    "n_jobs": 2,
+    "number_of_fingerprints": 4,
+}
+
+
+def test_parse_memory_size():
+    """Test that memory sizes are parsed with their units."""
+    assert parse_memory_size("512") == 512
+    assert parse_memory_size("16GB") == 16 * 10**9
+    assert parse_memory_size("1.5 MiB") == 3 * 2**19
+    with pytest.raises(InvalidMemorySize):
+        parse_memory_size("16 parsecs")
+
+
+def test_unbounded_plan():
+    """Test that without a budget the whole matrices are computed at once."""
+    plan: MemoryPlan = MemoryBudget().plan(**STEP)
+    assert plan.spectral_tile_size == 50
+    assert plan.jaccard_tile_size == 100
+    assert plan.rank_correlation_pairs == 100 * 100
+    assert not plan.samples_rank_correlations
+
+
+def test_tile_sizes():
+    """Test that the tiles shrink to fit the budget, without changing the results."""
+    large: MemoryPlan = MemoryBudget(4_000_000).plan(**STEP)
+    assert large.spectral_tile_size == 50
+    assert large.jaccard_tile_size == 100
+    assert large.to_dict() == MemoryBudget().plan(**STEP).to_dict()
+
+    # The copies of the columns held by the workers shrink the spectral tiles.
+    crowded: MemoryPlan = MemoryBudget(4_000_000).plan(**STEP, spectrum_bytes=9000)
+    assert crowded.spectral_tile_size == 24
+    assert crowded.to_dict() == large.to_dict()
+
+    # The ranks of all the pairs leave less memory to the Jaccard tiles.
+    small: MemoryPlan = MemoryBudget(1_760_000).plan(**STEP)
+    assert small.jaccard_tile_size == 14
+    assert small.structures_tile_size == 88
+    assert not small.samples_rank_correlations
+
+
+def test_pipelined_tile_sizes():
+    """Test that pipelining and prefetching shrink the tiles, not the rank pairs."""
+    sequential: MemoryPlan = MemoryBudget(3_600_000, sample_rank_pairs=True).plan(
+        **STEP
+    )
+    pipelined: MemoryPlan = MemoryBudget(3_600_000, sample_rank_pairs=True).plan(
+        **STEP, steps_in_flight=2
+    )
+    assert (sequential.spectral_tile_size, sequential.jaccard_tile_size) == (50, 100)
+    assert (pipelined.spectral_tile_size, pipelined.jaccard_tile_size) == (16, 32)
+    assert pipelined.to_dict() == sequential.to_dict()
+
+    prefetching: MemoryPlan = MemoryBudget(4_000_000).plan(
+        **STEP, steps_in_flight=2, prefetched_bytes=500_000
+    )
+    assert (prefetching.spectral_tile_size, prefetching.jaccard_tile_size) == (5, 11)
+    assert prefetching.to_dict() == sequential.to_dict()
+
+
+def test_pool_tile_sizes():
+    """Test that the tiles of the similarities of a pool have their own size."""
+    assert MemoryBudget().plan(**STEP, pool_size=200).structures_tile_size == 200
+
+    # The pool Jaccard similarities are computed before any ranks are kept,
+    # while the correlation tiles also hold the indices of their pairs.
+    plan: MemoryPlan = MemoryBudget(3_000_000).plan(**STEP, pool_size=200)
+    assert plan.structures_tile_size == 200
+    assert plan.jaccard_tile_size == 99
+
+
+def test_rank_pairs_sampling_threshold():
+    """Test that the pairs of the rank correlations are only sampled when allowed."""
+    with pytest.raises(InsufficientMemoryBudget):
+        MemoryBudget(1_600_000).plan(**STEP)
+
+    plan: MemoryPlan = MemoryBudget(1_600_000, sample_rank_pairs=True).plan(**STEP)
+    assert plan.samples_rank_correlations
+    assert plan.rank_correlation_pairs == 4566
+    assert plan.to_dict() == {"rank_correlation_pairs": 4566}
+
+    # When all of the pairs fit, they are not sampled even if allowed.
+    plan = MemoryBudget(4_000_000, sample_rank_pairs=True).plan(**STEP)
+    assert not plan.samples_rank_correlations
+    assert plan.to_dict() == {"rank_correlation_pairs": None}
+
+
+def test_insufficient_memory_budget():
+    """Test that a budget not fitting one of the stages is reported as insufficient."""
+    for budget, step in (
+        # The fingerprinting of the sample does not fit.
+        (1_500_000, STEP),
+        # The spectra of the dataset leave too little memory.
+        (4_000_000, {**STEP, "dataset_bytes": 3_000_000}),
+        # The copies of the columns held by the workers do not fit.
+        (4_000_000, {**STEP, "spectrum_bytes": 9500}),
+        # The next dataset does not fit alongside the pipelined steps.
+        (4_000_000, {**STEP, "steps_in_flight": 2, "prefetched_bytes": 2_000_000}),
+    ):
+        with pytest.raises(InsufficientMemoryBudget):
+            MemoryBudget(budget, sample_rank_pairs=True).plan(**step)
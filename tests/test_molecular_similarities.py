@@ -0,0 +1,59 @@
+"""Test the molecular similarities computed on the packed fingerprints."""
+
+import numpy as np
+from experiments.molecular_similarities import (
+    FINGERPRINT_SIZE,
+    FINGERPRINT_TRANSFORMERS,
+    all_fingerprints,
+    jaccard,
+    tiled_jaccard,
+)
+
+SMILES: list[str] = [
+    "CCO",
+    "c1ccccc1",
+    "CC(=O)O",
+    "CCN",
+    "CCCC",
+    "c1ccncc1",
+    "OCC(O)CO",
+    "CC(C)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+]
+
+
+def test_jaccard():
+    """Test that the packed kernel matches the fraction of equal unpacked bits."""
+    rng = np.random.default_rng(42)
+    rows = rng.integers(2, size=(17, FINGERPRINT_SIZE), dtype=np.uint8)
+    columns = rng.integers(2, size=(13, FINGERPRINT_SIZE), dtype=np.uint8)
+    columns[:5] = rows[:5]
+    columns[5] = 1 - rows[5]
+
+    expected = (
+        (rows[:, None, :] == columns[None, :, :]).sum(axis=2) / FINGERPRINT_SIZE
+    ).astype(np.float32)
+    similarities = jaccard(np.packbits(rows, axis=1), np.packbits(columns, axis=1))
+    assert similarities.dtype == np.float32
+    assert np.array_equal(similarities, expected)
+    assert np.array_equal(
+        tiled_jaccard(np.packbits(rows, axis=1), np.packbits(columns, axis=1), 4),
+        expected,
+    )
+
+
+def test_all_fingerprints():
+    """Test that the fingerprints computed by chunks match each transformer."""
+    for n_jobs in (1, 2):
+        fingerprints = all_fingerprints(SMILES, verbose=False, n_jobs=n_jobs)
+        assert list(fingerprints) == [
+            fingerprint_transformer.__name__
+            for fingerprint_transformer in FINGERPRINT_TRANSFORMERS
+        ]
+        for fingerprint_transformer in FINGERPRINT_TRANSFORMERS:
+            assert np.array_equal(
+                np.unpackbits(fingerprints[fingerprint_transformer.__name__], axis=1),
+                fingerprint_transformer(
+                    fp_size=FINGERPRINT_SIZE, verbose=False, n_jobs=1
+                ).fit_transform(SMILES),
+            )
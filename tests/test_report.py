@@ -0,0 +1,50 @@
+"""Test the report of the stored results of the experiment."""
+
+import pandas as pd
+import pytest
+from experiments.exceptions import MissingStepResults
+from experiments.report import load_results
+from tests.test_experiment import EXPERIMENT_MODULE, BinnedScore, run_experiment
+
+
+def _sorted(results: pd.DataFrame) -> pd.DataFrame:
+    """Return the results sorted by all of their columns."""
+    return results.sort_values(list(results.columns)).reset_index(drop=True)
+
+
+def test_load_results(tmp_path, monkeypatch):
+    """Test that the stored steps of each run are reported as the run returned them."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(EXPERIMENT_MODULE, "MS2DeepScore", BinnedScore)
+    monkeypatch.setattr(EXPERIMENT_MODULE, "plot_results", lambda results: None)
+
+    resampled = run_experiment("data", cache=True)
+    other_random_state = run_experiment(
+        "data", iterations=1, random_state=7, cache=True
+    )
+    subsampled = run_experiment("data", cache=True, iteration_mode="subsample")
+    # The first iteration of the resampled run is loaded from its stored steps.
+    first_iteration = run_experiment("data", iterations=1, cache=True)
+
+    for filters, expected in (
+        ({"random_state": 42, "iteration_mode": "resample"}, resampled),
+        (
+            {"random_state": 42, "iterations": 2, "iteration_mode": "resample"},
+            resampled,
+        ),
+        ({"random_state": 42, "iterations": 1}, first_iteration),
+        ({"random_state": 7}, other_random_state),
+        (
+            {"random_state": 42, "iterations": 2, "iteration_mode": "subsample"},
+            subsampled,
+        ),
+    ):
+        pd.testing.assert_frame_equal(
+            _sorted(load_results("results", **filters)), _sorted(expected)
+        )
+
+    assert len(load_results("results")) == sum(
+        len(results) for results in (resampled, other_random_state, subsampled)
+    )
+    with pytest.raises(MissingStepResults):
+        load_results("results", random_state=42, iteration_mode="bootstrap")
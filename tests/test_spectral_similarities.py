@@ -0,0 +1,123 @@
+"""Test the combined spectral similarities against the separate measures."""
+
+import numpy as np
+from matchms import Spectrum
+from experiments.spectral_similarities import (
+    CosineFamily,
+    CosineGreedy,
+    ModifiedCosine,
+    NeutralLossesCosine,
+    SpectralSimilarity,
+    UnweightedMassSpecEntropy,
+    WeightedMassSpecEntropy,
+)
+
+TOLERANCES: list[float] = [0.01, 0.1, 0.5]
+PPM_TOLERANCES: list[float] = [5.0, 20.0, 100.0]
+
+
+def _random_spectra(number_of_spectra: int, random_state: int) -> list[Spectrum]:
+    """Return random spectra with close peaks, some of them above the precursor.
+
+    The peaks are drawn around shared fragments, so that the peaks of different
+    spectra match at some of the tolerances and not at others.
+    """
+    rng = np.random.default_rng(random_state)
+    fragments = rng.uniform(50, 200, 60)
+    spectra: list[Spectrum] = []
+    for _ in range(number_of_spectra):
+        number_of_peaks = rng.integers(1, 30)
+        mz = np.unique(
+            rng.choice(fragments, number_of_peaks, replace=False)
+            + rng.normal(0, 0.01, number_of_peaks)
+        )
+        spectra.append(
+            Spectrum(
+                mz=mz,
+                intensities=rng.uniform(0.01, 1.0, mz.size),
+                metadata={"precursor_mz": round(rng.uniform(100, 250), 2)},
+            )
+        )
+    return spectra
+
+
+def _random_pairs(
+    spectra: list[Spectrum], random_state: int
+) -> list[tuple[Spectrum, Spectrum]]:
+    """Return random pairs of the spectra, including the self-pairs."""
+    rng = np.random.default_rng(random_state)
+    return [
+        (spectra[i], spectra[j]) for i, j in rng.integers(len(spectra), size=(60, 2))
+    ] + [(spectrum, spectrum) for spectrum in spectra[:5]]
+
+
+def test_cosine_family():
+    """Test that the cosine family matches the separate MatchMS measures."""
+    spectra = _random_spectra(40, 42)
+    for tolerance in TOLERANCES:
+        family = CosineFamily(tolerance, verbose=False)
+        measures = [
+            CosineGreedy(tolerance, verbose=False),
+            ModifiedCosine(tolerance, verbose=False),
+            NeutralLossesCosine(tolerance, verbose=False),
+        ]
+        for spectrum1, spectrum2 in _random_pairs(spectra, 7):
+            assert np.array_equal(
+                family.compute_similarity(spectrum1, spectrum2),
+                [
+                    measure.compute_similarity(spectrum1, spectrum2)
+                    for measure in measures
+                ],
+            )
+
+
+def test_cosine_family_precursor_mz():
+    """Test that the precursor m/z is converted as in the MatchMS measures."""
+    spectrum1, spectrum2 = _random_spectra(2, 3)
+    expected = CosineFamily(0.1, verbose=False).compute_similarity(spectrum1, spectrum2)
+    precursor_mz: float = spectrum2.get("precursor_mz")
+    for converted_precursor_mz in (str(precursor_mz), np.float64(precursor_mz)):
+        spectrum2.set("precursor_mz", converted_precursor_mz)
+        assert np.array_equal(
+            CosineFamily(0.1, verbose=False).compute_similarity(spectrum1, spectrum2),
+            expected,
+        )
+
+    # The numpy scalars are accepted as the precursor m/z they hold.
+    spectrum2.set("precursor_mz", float(np.float32(precursor_mz)))
+    expected = CosineFamily(0.1, verbose=False).compute_similarity(spectrum1, spectrum2)
+    spectrum2.set("precursor_mz", np.float32(precursor_mz))
+    assert np.array_equal(
+        CosineFamily(0.1, verbose=False).compute_similarity(spectrum1, spectrum2),
+        expected,
+    )
+
+
+def test_multiple_tolerances():
+    """Test that the similarities at several tolerances match separate measures."""
+    spectra = _random_spectra(12, 11)
+    for measure_class, tolerances in (
+        (CosineFamily, TOLERANCES),
+        (UnweightedMassSpecEntropy, PPM_TOLERANCES),
+        (WeightedMassSpecEntropy, PPM_TOLERANCES),
+    ):
+        measure: SpectralSimilarity = measure_class(tolerances, verbose=False)
+        separate_measures: list[SpectralSimilarity] = [
+            measure_class(tolerance, verbose=False) for tolerance in tolerances
+        ]
+        assert len(measure.similarity_names()) == len(tolerances) * len(
+            separate_measures[0].similarity_names()
+        )
+
+        # The similarities are stacked by name and then by tolerance.
+        similarities = measure._compute_similarities((spectra[:5], spectra))
+        separate_similarities = np.stack(
+            [
+                separate_measure._compute_similarities((spectra[:5], spectra)).reshape(
+                    -1, 5, len(spectra)
+                )
+                for separate_measure in separate_measures
+            ],
+            axis=1,
+        ).reshape(similarities.shape)
+        assert np.array_equal(similarities, separate_similarities), measure.name()